@@ -0,0 +1,85 @@
+"""
+Recall-vs-latency benchmark of the knowledge base index types against the
+exact flat inner-product baseline, on synthetic clustered embeddings.
+
+    python -m benchmarks.ann_benchmark --size 1000000 --dim 1536 --queries 500
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from enums.vector_index_type import VectorIndexType
+from services.vector_index_factory import VectorIndexFactory
+from utils.vector_math import normalize_rows
+
+
+def make_corpus(size: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, size)
+    noise = rng.standard_normal((size, dim)).astype(np.float32) * 0.5
+    return normalize_rows(centers[assignment] + noise)
+
+
+def search(index: faiss.Index, queries: np.ndarray, k: int) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    _, ids = index.search(queries, k)
+    elapsed = time.perf_counter() - start
+    return ids, elapsed / len(queries) * 1000
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[32, 64, 128])
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.size, args.dim, args.clusters, args.seed)
+    queries = make_corpus(args.queries, args.dim, args.clusters, args.seed + 1)
+
+    baseline = VectorIndexFactory(VectorIndexType.FLAT_IP).create(args.dim)
+    baseline.add(corpus)
+    truth, flat_ms = search(baseline, queries, args.k)
+
+    rows = [("flat_ip", "-", 0.0, 1.0, flat_ms)]
+
+    hnsw_factory = VectorIndexFactory(VectorIndexType.HNSW)
+    start = time.perf_counter()
+    hnsw = hnsw_factory.create(args.dim)
+    hnsw.add(corpus)
+    build_s = time.perf_counter() - start
+    for ef in args.ef_search:
+        hnsw.hnsw.efSearch = ef
+        ids, ms = search(hnsw, queries, args.k)
+        rows.append(("hnsw", f"efSearch={ef}", build_s, recall_at_k(ids, truth), ms))
+
+    ivf_factory = VectorIndexFactory(VectorIndexType.IVF_PQ)
+    start = time.perf_counter()
+    ivf = ivf_factory.migrate(baseline)
+    build_s = time.perf_counter() - start
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        ids, ms = search(ivf, queries, args.k)
+        rows.append(("ivf_pq", f"nprobe={nprobe}", build_s, recall_at_k(ids, truth), ms))
+
+    print(f"{args.size} vectors, dim={args.dim}, {args.queries} queries, recall@{args.k}")
+    print(f"{'index':<8} {'params':<14} {'build s':>8} {'recall':>8} {'ms/query':>9}")
+    for name, params, build, recall, ms in rows:
+        print(f"{name:<8} {params:<14} {build:>8.1f} {recall:>8.3f} {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
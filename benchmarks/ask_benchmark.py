@@ -0,0 +1,355 @@
+"""
+End-to-end benchmark of POST /api/ask against a local fake OpenAI server.
+
+The application is driven in-process through its ASGI interface, with the
+OpenAI base URL pointed at benchmarks.fake_openai running in a child process,
+so results do not depend on the network or on API quotas. Each scenario sends
+questions with attachments of a given size against a knowledge base of a
+given size, and reports throughput, p50/p99 latency, time to first token,
+peak RSS and the mean time of every instrumented stage.
+
+    python -m benchmarks.ask_benchmark --attachment-tokens 0 4000 12000 --kb-size 5000 --save baseline.json
+    python -m benchmarks.ask_benchmark --attachment-tokens 0 4000 12000 --kb-size 5000 --baseline baseline.json
+
+tiktoken downloads its encodings on first use; point TIKTOKEN_CACHE_DIR at a
+warm cache for fully offline runs.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+from benchmarks import fake_openai
+from benchmarks.fake_openai import FakeOpenAIOptions
+
+# Metrics where a higher value is better; every other compared metric is a latency or a size
+_HIGHER_IS_BETTER = {"throughput_rps"}
+_COMPARED = ("throughput_rps", "latency_p50_ms", "latency_p99_ms", "ttft_p50_ms", "ttft_p99_ms", "peak_rss_mb")
+
+
+@dataclass
+class RequestResult:
+    status: int
+    latency: float
+    ttft: Optional[float]
+    failed: bool
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def synthetic_text(words: int, seed: int) -> str:
+    rng = random.Random(seed)
+    vocabulary = [f"{stem}{suffix}" for stem in ("study", "exam", "topic", "lecture", "review", "chapter",
+                                                  "practice", "note", "deadline", "project")
+                  for suffix in ("", "s", "ing", "ed", "er")]
+    paragraphs, sentences, sentence = [], [], []
+    for _ in range(words):
+        sentence.append(rng.choice(vocabulary))
+        if len(sentence) == 12:
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            sentence = []
+        if len(sentences) == 6:
+            paragraphs.append(" ".join(sentences))
+            sentences = []
+    if sentence:
+        sentences.append(" ".join(sentence).capitalize() + ".")
+    if sentences:
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Fake OpenAI server did not start on port {port}.")
+
+
+def configure_environment(base_url: str, workdir: str) -> None:
+    # Settings are read at import time, so this must run before the app is imported
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(workdir, "vector_store")
+    os.environ["METRICS_ENABLED"] = "true"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("MODEL", "gpt-4")
+    os.environ.setdefault("MODEL_MAX_TOKENS", "8000")
+    os.environ.setdefault("EMBEDDING_MODEL", "text-embedding-3-small")
+    os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+    os.environ.setdefault("SUMMARY_CACHE_PATH", "")
+
+
+async def ask(app, payload: dict) -> RequestResult:
+    """
+    Sends one request straight to the ASGI app and timestamps the first SSE
+    frame carrying answer text.
+    """
+    body = json.dumps(payload).encode("utf-8")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/ask",
+        "raw_path": b"/api/ask",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+    request_sent = False
+    finished = asyncio.Event()
+    status = 0
+    ttft: Optional[float] = None
+    failed = False
+    pending = b""
+    start = time.perf_counter()
+
+    async def receive() -> dict:
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # The client stays connected until the whole response has been read
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        nonlocal status, ttft, failed, pending
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            return
+        if message["type"] != "http.response.body":
+            return
+
+        pending += message.get("body", b"")
+        *frames, pending = pending.split(b"\n\n")
+        for frame in frames:
+            if frame.startswith(b"event: error"):
+                failed = True
+            if ttft is None:
+                for line in frame.split(b"\n"):
+                    if line.startswith(b"data: ") and json.loads(line[6:]).get("reply"):
+                        ttft = time.perf_counter() - start
+                        break
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+
+    return RequestResult(status=status, latency=time.perf_counter() - start, ttft=ttft,
+                         failed=failed or status != 200)
+
+
+def build_payload(attachment_words: int, seed: int, max_output_tokens: int) -> dict:
+    payload = {
+        "prompt": "Make me a two week study plan for the upcoming exams.",
+        "max_output_tokens": max_output_tokens,
+    }
+    if attachment_words > 0:
+        payload["attachments"] = [{"fileName": f"notes-{seed}.txt", "content": synthetic_text(attachment_words, seed)}]
+    return payload
+
+
+async def populate_knowledge_base(registry, size: int, chunk_words: int, seed: int) -> None:
+    rag_service = registry.rag_service
+    batch_size = 500
+    for start in range(0, size, batch_size):
+        texts = [synthetic_text(chunk_words, seed + i) for i in range(start, min(size, start + batch_size))]
+        await rag_service.index_chunks(rag_service.to_rag_chunks(texts, "knowledge_base"))
+
+
+async def run_scenario(app, attachment_words: int, args, seed: int) -> dict:
+    from utils.metrics import STAGE_SECONDS
+
+    for i in range(args.warmup):
+        await ask(app, build_payload(attachment_words, seed - 1 - i, args.max_output_tokens))
+    STAGE_SECONDS.reset()
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(args.requests):
+        # Every request gets a distinct attachment so caches do not flatter the numbers
+        queue.put_nowait(build_payload(attachment_words, seed + i, args.max_output_tokens))
+    results: List[RequestResult] = []
+
+    async def worker() -> None:
+        while True:
+            try:
+                payload = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            results.append(await ask(app, payload))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [r.latency * 1000 for r in results]
+    ttfts = [r.ttft * 1000 for r in results if r.ttft is not None]
+    stages = {
+        key[0]: {"count": count, "mean_ms": round(total / count * 1000, 3)}
+        for key, (count, total) in sorted(STAGE_SECONDS.summary().items()) if count
+    }
+    return {
+        "requests": len(results),
+        "failures": sum(r.failed for r in results),
+        "throughput_rps": round(len(results) / elapsed, 3),
+        "latency_p50_ms": round(percentile(latencies, 50), 3),
+        "latency_p99_ms": round(percentile(latencies, 99), 3),
+        "ttft_p50_ms": round(percentile(ttfts, 50), 3),
+        "ttft_p99_ms": round(percentile(ttfts, 99), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": stages,
+    }
+
+
+async def run(args, base_url: str) -> dict:
+    with tempfile.TemporaryDirectory(prefix="ask-benchmark-") as workdir:
+        configure_environment(base_url, workdir)
+        from main import app
+
+        async with app.router.lifespan_context(app):
+            registry = app.state.service_registry
+            load_start = time.perf_counter()
+            await populate_knowledge_base(registry, args.kb_size, args.kb_chunk_words, args.seed + 1_000_000)
+            kb_seconds = time.perf_counter() - load_start
+
+            scenarios = {}
+            for index, attachment_words in enumerate(args.attachment_tokens):
+                name = f"attachment_{attachment_words}"
+                scenarios[name] = await run_scenario(app, attachment_words, args, args.seed + index * 100_000)
+                print_scenario(name, scenarios[name])
+
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "kb_size": args.kb_size,
+            "kb_load_seconds": round(kb_seconds, 3),
+            "max_output_tokens": args.max_output_tokens,
+            "fake_openai": asdict(fake_options(args)),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def print_scenario(name: str, result: dict) -> None:
+    print(f"\n{name}: {result['requests']} requests, {result['failures']} failed")
+    for metric in _COMPARED:
+        print(f"  {metric:<16} {result[metric]:>12.3f}")
+    for stage, timing in result["stages"].items():
+        print(f"  stage {stage:<20} {timing['mean_ms']:>10.3f} ms  x{timing['count']}")
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    regressions = []
+    print(f"\nComparison against baseline (tolerance {tolerance:.0%})")
+    for name, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            print(f"  {name}: not in baseline")
+            continue
+        for metric in _COMPARED:
+            old, new = previous.get(metric), result[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in _HIGHER_IS_BETTER else change
+            flag = "REGRESSION" if worse > tolerance else ""
+            print(f"  {name:<20} {metric:<16} {old:>12.3f} -> {new:>12.3f} ({change:+.1%}) {flag}")
+            if flag:
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+
+def fake_options(args) -> FakeOpenAIOptions:
+    return FakeOpenAIOptions(
+        dim=args.dim,
+        embedding_latency_ms=args.embedding_latency_ms,
+        llm_first_token_ms=args.llm_first_token_ms,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--attachment-tokens", type=int, nargs="+", default=[0, 4000, 12000, 24000],
+                        help="Approximate attachment sizes, one scenario each; 0 sends no attachment")
+    parser.add_argument("--kb-size", type=int, default=2000, help="Chunks indexed before the run")
+    parser.add_argument("--kb-chunk-words", type=int, default=120)
+    parser.add_argument("--max-output-tokens", type=int, default=512)
+    parser.add_argument("--dim", type=int, default=FakeOpenAIOptions.dim)
+    parser.add_argument("--embedding-latency-ms", type=float, default=FakeOpenAIOptions.embedding_latency_ms)
+    parser.add_argument("--llm-first-token-ms", type=float, default=FakeOpenAIOptions.llm_first_token_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeOpenAIOptions.tokens_per_second)
+    parser.add_argument("--output-tokens", type=int, default=FakeOpenAIOptions.output_tokens)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare the results with this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    # The fake API runs in its own process so it neither shares the GIL nor inflates the RSS being measured
+    port = free_port()
+    server = multiprocessing.get_context("spawn").Process(
+        target=fake_openai.serve, args=(port, fake_options(args)), daemon=True
+    )
+    server.start()
+    try:
+        wait_for_port(port)
+        results = asyncio.run(run(args, f"http://127.0.0.1:{port}/v1"))
+    finally:
+        server.terminate()
+        server.join()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Throughput of TextPreprocessingService.clean_summary on synthetic model
+summaries, next to the previous line-by-line re.sub implementation.
+
+Before timing, both implementations are run on the generated summaries and on
+randomly generated markup-heavy text, and any difference in output fails the
+run, so the benchmark doubles as a golden check of the cleaning rules.
+
+    python -m benchmarks.clean_summary_benchmark --summary-kb 64 --summaries 200 --fuzz-cases 20000
+"""
+import argparse
+import random
+import re
+import time
+
+from services.text_preprocessing_service import TextPreprocessingService
+
+WORDS = ("study plan week review exam chapter lecture notes practice deadline project topic "
+         "revise focus schedule goal summary reading assignment lab").split()
+
+
+def reference_clean_summary(text: str, meta_line_max_len: int = TextPreprocessingService.META_LINE_MAX_LEN) -> str:
+    # The implementation clean_summary replaced, kept as the source of truth for its output
+    if not text or not text.strip():
+        return ""
+
+    cleaned_lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        line = re.sub(r'^#{1,6}\s*', '', line)
+        line = re.sub(r'^[-•*]\s*', '', line)
+        if len(line) <= meta_line_max_len and line.endswith(":"):
+            continue
+        if "?" in line:
+            continue
+        line = re.sub(r'(\*\*|__)(.*?)\1', r'\2', line)
+        line = re.sub(r'([*_])(.*?)\1', r'\2', line)
+        cleaned_lines.append(line)
+
+    cleaned_text = "\n".join(cleaned_lines)
+    cleaned_text = re.sub(r'\n{3,}', '\n\n', cleaned_text)
+    return cleaned_text.strip()
+
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 18))]
+    if rng.random() < 0.2:
+        i = rng.randrange(len(words))
+        words[i] = f"**{words[i]}**"
+    if rng.random() < 0.1:
+        i = rng.randrange(len(words))
+        words[i] = f"_{words[i]}_"
+    return " ".join(words).capitalize() + "."
+
+
+def summary(size_chars: int, rng: random.Random) -> str:
+    # Shaped like a model summary: sections with headers, bullets, prose and the odd offer to help
+    lines = []
+    while sum(len(line) + 1 for line in lines) < size_chars:
+        kind = rng.random()
+        if kind < 0.08:
+            lines.extend(["", f"{'#' * rng.randint(1, 3)} {rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}"])
+        elif kind < 0.12:
+            lines.append(f"{rng.choice(WORDS).capitalize()}:")
+        elif kind < 0.45:
+            lines.append(f"{rng.choice('-*•')} {sentence(rng)}")
+        elif kind < 0.47:
+            lines.append("Would you like me to turn this into a weekly schedule?")
+        else:
+            lines.append(" ".join(sentence(rng) for _ in range(rng.randint(1, 4))))
+    return "\n".join(lines)
+
+
+def fuzz_case(rng: random.Random) -> str:
+    # Dense in everything the rules react to, including unusual line breaks
+    alphabet = ["#", "-", "*", "•", "_", "**", "__", "?", ":", " ", "\t", "\n", "\n\n", "\n\n\n", "\r\n",
+                "\r", " ", "\x0b", "\x85", "a", "b", "word", "Summary:", "x" * 45]
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+
+
+def throughput(func, texts, repeat: int) -> float:
+    total_chars = sum(len(t) for t in texts) * repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            func(text)
+    elapsed = time.perf_counter() - start
+    # Summaries are mostly ASCII, so characters are a close stand-in for bytes
+    return total_chars / elapsed / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--summary-kb", type=int, default=64, help="Approximate size of each summary")
+    parser.add_argument("--summaries", type=int, default=200)
+    parser.add_argument("--fuzz-cases", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # clean_summary only needs META_LINE_MAX_LEN, so the tokenizer is never loaded
+    service = TextPreprocessingService.__new__(TextPreprocessingService)
+    summaries = [summary(args.summary_kb * 1024, rng) for _ in range(args.summaries)]
+    cases = summaries + [fuzz_case(rng) for _ in range(args.fuzz_cases)]
+
+    for i, text in enumerate(cases):
+        expected, actual = reference_clean_summary(text), service.clean_summary(text)
+        if expected != actual:
+            raise SystemExit(f"Output differs from the reference on case {i}:\n"
+                             f"input    {text!r}\nexpected {expected!r}\nactual   {actual!r}")
+    print(f"Identical output on {len(summaries)} summaries and {args.fuzz_cases} fuzz cases")
+
+    reference = throughput(reference_clean_summary, summaries, args.repeat)
+    current = throughput(service.clean_summary, summaries, args.repeat)
+    size_mb = sum(len(t) for t in summaries) / 1e6
+    print(f"{args.summaries} summaries, {size_mb:.1f} MB")
+    print(f"reference  {reference:>8.1f} MB/s")
+    print(f"current    {current:>8.1f} MB/s  ({current / reference:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
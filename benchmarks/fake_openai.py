@@ -0,0 +1,189 @@
+"""
+Local stand-in for the parts of the OpenAI API the service uses (embeddings and
+the Responses API, streamed or not). Answers are deterministic and latency is
+configurable, so benchmark runs are reproducible and cost nothing.
+
+    python -m benchmarks.fake_openai --port 8765 --llm-first-token-ms 300 --tokens-per-second 80
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, List
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_WORDS = ("plan", "study", "review", "session", "topic", "goal", "week", "focus", "practice", "notes")
+
+
+@dataclass
+class FakeOpenAIOptions:
+    dim: int = 1536
+    embedding_latency_ms: float = 20.0
+    embedding_ms_per_input: float = 0.05
+    llm_first_token_ms: float = 300.0
+    tokens_per_second: float = 80.0
+    output_tokens: int = 200
+    delta_tokens: int = 4
+
+
+def fake_embedding(value, dim: int) -> np.ndarray:
+    # Seeded from the input so the same text always gets the same vector
+    seed = int.from_bytes(hashlib.sha256(repr(value).encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _approximate_tokens(value) -> int:
+    if isinstance(value, list):
+        return len(value)
+    return len(str(value)) // 4 + 1
+
+
+def _response_body(response_id: str, model: str, text: str, input_tokens: int, output_tokens: int) -> dict:
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": model,
+        "output": [{
+            "type": "message",
+            "id": f"msg_{response_id}",
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def create_app(options: FakeOpenAIOptions) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        payload = await request.json()
+        inputs = payload["input"]
+        # A single string or a single token list is one input
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        await asyncio.sleep((options.embedding_latency_ms + options.embedding_ms_per_input * len(inputs)) / 1000)
+
+        data = []
+        for i, value in enumerate(inputs):
+            vector = fake_embedding(value, options.dim)
+            if payload.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+        prompt_tokens = sum(_approximate_tokens(value) for value in inputs)
+        return JSONResponse({
+            "object": "list",
+            "data": data,
+            "model": payload.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+        })
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        payload = await request.json()
+        model = payload.get("model", "fake-model")
+        input_tokens = _approximate_tokens(payload.get("instructions") or "") + _approximate_tokens(payload.get("input") or "")
+        output_tokens = min(options.output_tokens, payload.get("max_output_tokens") or options.output_tokens)
+        words = [_WORDS[i % len(_WORDS)] + " " for i in range(output_tokens)]
+        response_id = f"resp_{uuid.uuid4().hex}"
+
+        if not payload.get("stream"):
+            await asyncio.sleep(options.llm_first_token_ms / 1000 + output_tokens / max(options.tokens_per_second, 1e-9))
+            return JSONResponse(_response_body(response_id, model, "".join(words), input_tokens, output_tokens))
+
+        return StreamingResponse(
+            _stream_events(options, response_id, model, words, input_tokens),
+            media_type="text/event-stream"
+        )
+
+    return app
+
+
+async def _stream_events(
+        options: FakeOpenAIOptions,
+        response_id: str,
+        model: str,
+        words: List[str],
+        input_tokens: int) -> AsyncIterator[str]:
+    sequence = 0
+
+    def event(body: dict) -> str:
+        nonlocal sequence
+        body["sequence_number"] = sequence
+        sequence += 1
+        return f"event: {body['type']}\ndata: {json.dumps(body)}\n\n"
+
+    in_progress = _response_body(response_id, model, "", input_tokens, 0)
+    in_progress["status"] = "in_progress"
+    yield event({"type": "response.created", "response": in_progress})
+
+    await asyncio.sleep(options.llm_first_token_ms / 1000)
+    step = max(1, options.delta_tokens)
+    for i in range(0, len(words), step):
+        delta = words[i:i + step]
+        yield event({
+            "type": "response.output_text.delta",
+            "item_id": f"msg_{response_id}",
+            "output_index": 0,
+            "content_index": 0,
+            "delta": "".join(delta),
+        })
+        if options.tokens_per_second > 0:
+            await asyncio.sleep(len(delta) / options.tokens_per_second)
+
+    completed = _response_body(response_id, model, "".join(words), input_tokens, len(words))
+    yield event({"type": "response.completed", "response": completed})
+
+
+def serve(port: int, options: FakeOpenAIOptions) -> None:
+    import uvicorn
+
+    uvicorn.run(create_app(options), host="127.0.0.1", port=port, log_level="warning")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dim", type=int, default=FakeOpenAIOptions.dim)
+    parser.add_argument("--embedding-latency-ms", type=float, default=FakeOpenAIOptions.embedding_latency_ms)
+    parser.add_argument("--llm-first-token-ms", type=float, default=FakeOpenAIOptions.llm_first_token_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeOpenAIOptions.tokens_per_second)
+    parser.add_argument("--output-tokens", type=int, default=FakeOpenAIOptions.output_tokens)
+    args = parser.parse_args()
+
+    serve(args.port, FakeOpenAIOptions(
+        dim=args.dim,
+        embedding_latency_ms=args.embedding_latency_ms,
+        llm_first_token_ms=args.llm_first_token_ms,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Cold start time and per-worker memory of the API served by cli.serve.
+
+A knowledge base snapshot of the given size is written to a temporary
+directory, then the server is started once per mode:
+
+    private   --no-preload, every worker imports everything and loads its own copy of the index
+    shared    preload in the parent and VECTOR_STORE_READ_ONLY, workers share the mapped index
+
+For each mode it reports the time until every worker has finished its
+lifespan startup, and the RSS and PSS (resident memory with shared pages
+divided among the processes sharing them) per worker. It also times a bare
+`import main`. Linux only, memory is read from /proc.
+
+    python -m benchmarks.startup_benchmark --workers 4 --kb-size 200000 --dim 1536
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.ask_benchmark import free_port
+
+_IMPORT_PROBE = """
+import json, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+rss_kb = next(int(line.split()[1]) for line in open("/proc/self/status") if line.startswith("VmRSS:"))
+print(json.dumps({"import_seconds": elapsed, "rss_mb": rss_kb / 1024}))
+"""
+
+
+def build_snapshot(path: str, size: int, dim: int, seed: int) -> None:
+    import faiss
+    from langchain_community.docstore import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((size, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    store = FAISS(embedding_function=None, index=faiss.IndexFlatIP(dim), docstore=InMemoryDocstore({}),
+                  index_to_docstore_id={})
+    store.add_embeddings(
+        text_embeddings=[(f"chunk {i} of the course notes", vectors[i]) for i in range(size)],
+        metadatas=[{"source_id": "benchmark", "chunk_index": i} for i in range(size)],
+        ids=[f"benchmark_{i}" for i in range(size)]
+    )
+    store.save_local(path)
+
+
+def environment(workdir: str, read_only: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "VECTOR_STORE_PATH": os.path.join(workdir, "vector_store"),
+        "VECTOR_STORE_READ_ONLY": "true" if read_only else "false",
+        "EMBEDDING_CACHE_PATH": "",
+        "SUMMARY_CACHE_PATH": "",
+    })
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    env.setdefault("MODEL", "gpt-4")
+    env.setdefault("MODEL_MAX_TOKENS", "8000")
+    env.setdefault("EMBEDDING_MODEL", "text-embedding-3-small")
+    return env
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as file:
+        for line in file:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def children(parent: int) -> List[int]:
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii") as file:
+                # The command name can contain spaces, the parent pid is the second field after it
+                fields = file.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent:
+            pids.append(int(entry))
+    return pids
+
+
+def run_mode(workdir: str, workers: int, preload: bool, read_only: bool, timeout: float) -> dict:
+    command = [sys.executable, "-m", "cli.serve", "--workers", str(workers), "--port", str(free_port()),
+               "--log-level", "info"]
+    if not preload:
+        command.append("--no-preload")
+
+    start = time.perf_counter()
+    server = subprocess.Popen(command, env=environment(workdir, read_only), stderr=subprocess.PIPE, text=True)
+    try:
+        ready = 0
+        for line in server.stderr:
+            if "Application startup complete" in line:
+                ready += 1
+                if ready == workers:
+                    break
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"Workers did not start within {timeout}s")
+        if ready < workers:
+            raise RuntimeError(f"Server exited with code {server.wait()} before every worker started")
+        startup_seconds = time.perf_counter() - start
+
+        worker_memory = [memory_kb(pid) for pid in children(server.pid)]
+        parent_memory = memory_kb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "startup_seconds": round(startup_seconds, 3),
+        "worker_rss_mb": round(sum(m["Rss"] for m in worker_memory) / len(worker_memory) / 1024, 1),
+        "worker_pss_mb": round(sum(m["Pss"] for m in worker_memory) / len(worker_memory) / 1024, 1),
+        "total_pss_mb": round((sum(m["Pss"] for m in worker_memory) + parent_memory["Pss"]) / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--kb-size", type=int, default=100_000, help="Vectors in the knowledge base snapshot")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="startup-benchmark-") as workdir:
+        start = time.perf_counter()
+        build_snapshot(os.path.join(workdir, "vector_store"), args.kb_size, args.dim, args.seed)
+        print(f"Snapshot of {args.kb_size} x {args.dim} vectors written in {time.perf_counter() - start:.1f}s")
+
+        probe = subprocess.run([sys.executable, "-c", _IMPORT_PROBE], env=environment(workdir, False),
+                               capture_output=True, text=True, check=True)
+        results = {"import": json.loads(probe.stdout.strip().splitlines()[-1])}
+        print(f"import main: {results['import']['import_seconds']:.3f}s, {results['import']['rss_mb']:.1f} MB RSS")
+
+        print(f"{'mode':<8} {'startup s':>10} {'RSS/worker':>11} {'PSS/worker':>11} {'total PSS':>10}")
+        for name, preload, read_only in (("private", False, False), ("shared", True, True)):
+            result = results[name] = run_mode(workdir, args.workers, preload, read_only, args.timeout)
+            print(f"{name:<8} {result['startup_seconds']:>10.2f} {result['worker_rss_mb']:>9.1f}MB "
+                  f"{result['worker_pss_mb']:>9.1f}MB {result['total_pss_mb']:>8.1f}MB")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
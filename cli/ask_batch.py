@@ -0,0 +1,100 @@
+"""
+Answers a JSONL file of questions without going through the API, e.g. for
+nightly study plan generation.
+
+    python -m cli.ask_batch plans.jsonl                         # results in plans.results.jsonl
+    python -m cli.ask_batch plans.jsonl --output out.jsonl --workers 16
+
+Each input line is a QuestionRequest with an optional "id". Results are
+appended to the output as items finish, so rerunning the same command after an
+interruption skips the items already answered and retries the failed ones.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from config.settings import get_settings
+from services.batch_question_service import BatchQuestionService, parse_batch_items
+from services.question_service import QuestionService
+from services.service_registry import ServiceRegistry
+
+
+def load_answered(path: str) -> set[str]:
+    if not os.path.exists(path):
+        return set()
+
+    # The last line for an id wins, a retried item may have failed before
+    answered: dict[str, bool] = {}
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                result = json.loads(line)
+                answered[result["id"]] = result.get("error") is None
+    return {item_id for item_id, ok in answered.items() if ok}
+
+
+async def run(args) -> tuple[int, int]:
+    with open(args.source, encoding="utf-8") as file:
+        items = parse_batch_items(file)
+    answered = load_answered(args.output)
+    remaining = [item for item in items if item.id not in answered]
+    print(f"{len(items)} items, {len(items) - len(remaining)} already answered", flush=True)
+
+    registry = ServiceRegistry(get_settings())
+    await registry.start()
+    succeeded = failed = 0
+    start = time.perf_counter()
+    try:
+        question_service = QuestionService(
+            text_preprocessing_service=registry.text_preprocessing_service,
+            rag_service=registry.rag_service,
+            llm_service=registry.llm_service,
+            summarization_service=registry.summarization_service,
+            summary_cache=registry.summary_cache,
+            semantic_cache=registry.semantic_cache,
+            indexing_queue=registry.indexing_queue
+        )
+        service = BatchQuestionService(
+            question_service=question_service,
+            admission_controller=registry.admission_controller,
+            workers=args.workers
+        )
+        with open(args.output, "a", encoding="utf-8") as output:
+            async for result in service.run(remaining):
+                output.write(result.model_dump_json() + "\n")
+                output.flush()
+                if result.error is None:
+                    succeeded += 1
+                else:
+                    failed += 1
+                if (succeeded + failed) % args.report_every == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"{succeeded + failed}/{len(remaining)} items ({failed} failed), "
+                          f"{(succeeded + failed) / elapsed:.2f} items/s", flush=True)
+    finally:
+        await registry.stop()
+    return succeeded, failed
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="JSONL file of questions")
+    parser.add_argument("--output", help="Results file, defaults to <source>.results.jsonl")
+    parser.add_argument("--workers", type=int, default=settings.batch_workers)
+    parser.add_argument("--report-every", type=int, default=10, help="Print progress every N items")
+    args = parser.parse_args()
+    args.output = args.output or f"{os.path.splitext(args.source)[0]}.results.jsonl"
+
+    start = time.perf_counter()
+    succeeded, failed = asyncio.run(run(args))
+    print(f"Done: {succeeded} answered, {failed} failed in {time.perf_counter() - start:.1f}s, "
+          f"results in {args.output}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
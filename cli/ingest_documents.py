@@ -0,0 +1,92 @@
+"""
+Loads course material into the knowledge base without going through the API.
+
+    python -m cli.ingest_documents notes/                   # every .txt/.md file under notes/
+    python -m cli.ingest_documents course.jsonl --workers 8  # one {"fileName", "content"} object per line
+
+Progress is recorded next to the input (or at --progress), so rerunning the
+same command after an interruption skips the documents already ingested.
+"""
+import argparse
+import asyncio
+import json
+import os
+from typing import Iterator, Sequence
+
+from config.settings import get_settings
+from models.document import Document
+from services.ingestion_service import DocumentIngestionService, IngestionProgress, IngestionReport
+from services.service_registry import ServiceRegistry
+
+
+def iter_directory(path: str, extensions: Sequence[str]) -> Iterator[Document]:
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(tuple(extensions)):
+                continue
+            file_path = os.path.join(root, name)
+            with open(file_path, encoding="utf-8", errors="replace") as file:
+                yield Document(fileName=os.path.relpath(file_path, path), content=file.read())
+
+
+def iter_jsonl(path: str) -> Iterator[Document]:
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield Document(**json.loads(line))
+
+
+def print_progress(report: IngestionReport, every: int) -> None:
+    done = report.documents + report.skipped_documents
+    if done % every == 0:
+        print(f"{report.documents} documents ({report.skipped_documents} skipped), "
+              f"{report.chunks} chunks, {report.chunks_per_second:.1f} chunks/s", flush=True)
+
+
+async def run(args) -> IngestionReport:
+    # This process is the writer even when the API workers serve a read-only snapshot
+    registry = ServiceRegistry(get_settings().model_copy(update={"vector_store_read_only": False}))
+    await registry.start()
+    progress = IngestionProgress(args.progress or f"{args.source.rstrip(os.sep)}.progress")
+    try:
+        service = DocumentIngestionService(
+            text_preprocessing_service=registry.text_preprocessing_service,
+            rag_service=registry.rag_service,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            chunk_tokens=args.chunk_tokens,
+            overlap_tokens=args.overlap_tokens
+        )
+        if os.path.isdir(args.source):
+            documents = iter_directory(args.source, args.extensions)
+        else:
+            documents = iter_jsonl(args.source)
+        return await service.ingest(documents, progress, lambda report: print_progress(report, args.report_every))
+    finally:
+        progress.close()
+        await registry.stop()
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="Directory of text files or a JSONL file of documents")
+    parser.add_argument("--progress", help="Progress file, defaults to <source>.progress")
+    parser.add_argument("--workers", type=int, default=settings.ingestion_workers)
+    parser.add_argument("--batch-size", type=int, default=settings.ingestion_batch_size)
+    parser.add_argument("--chunk-tokens", type=int, default=settings.ingestion_chunk_tokens)
+    parser.add_argument("--overlap-tokens", type=int, default=settings.ingestion_overlap_tokens)
+    parser.add_argument("--extensions", nargs="+", default=[".txt", ".md"])
+    parser.add_argument("--report-every", type=int, default=10, help="Print progress every N documents")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(f"Done: {report.documents} documents ingested, {report.skipped_documents} skipped, "
+          f"{report.chunks} chunks ({report.chunks - report.indexed_chunks} already indexed) "
+          f"in {report.seconds:.1f}s, {report.documents_per_second:.2f} documents/s, "
+          f"{report.chunks_per_second:.1f} chunks/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Serves the API from several worker processes forked from one parent.
+
+    python -m cli.serve --workers 4 --port 8000
+    VECTOR_STORE_READ_ONLY=true python -m cli.serve --workers 4   # workers share one mapped knowledge base
+
+Unless --no-preload is given, the parent runs ServiceRegistry.preload() before
+forking, so the heavy libraries, the tiktoken encoding and, with
+VECTOR_STORE_READ_ONLY, the memory-mapped snapshot are shared by every worker
+instead of being loaded by each. Each worker still runs the application
+lifespan for its own connections, caches and background tasks. A worker that
+exits is restarted; SIGINT or SIGTERM stops them all.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+from config.settings import get_settings
+from services.service_registry import ServiceRegistry
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies this soon after starting would only crash again
+MIN_WORKER_LIFETIME_SECONDS = 5.0
+
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def spawn(app, sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # The parent's handlers would signal the other workers, uvicorn installs its own
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    code = 0
+    try:
+        config = uvicorn.Config(app, lifespan="on", log_level=args.log_level, backlog=args.backlog)
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        logger.exception("Worker %d failed.", os.getpid())
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        help="Let every worker import and load everything itself")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+
+    sock = bind(args.host, args.port, args.backlog)
+    from main import app
+
+    if args.preload:
+        start = time.perf_counter()
+        ServiceRegistry.preload(get_settings())
+        logger.info("Preloaded in %.2fs.", time.perf_counter() - start)
+    # Everything loaded so far lives as long as the process; frozen objects are never
+    # touched by the collector, so their pages stay shared with the workers
+    gc.freeze()
+
+    workers = {spawn(app, sock, args): time.monotonic() for _ in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info("Serving on %s:%d with %d workers.", args.host, args.port, args.workers)
+
+    exit_code = 0
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started_at = workers.pop(pid, None)
+        if stopping or started_at is None:
+            continue
+
+        logger.warning("Worker %d exited with code %d.", pid, os.waitstatus_to_exitcode(status))
+        if time.monotonic() - started_at < MIN_WORKER_LIFETIME_SECONDS:
+            logger.error("Worker failed during startup, stopping.")
+            exit_code = 1
+            stop(signal.SIGTERM, None)
+        else:
+            workers[spawn(app, sock, args)] = time.monotonic()
+
+    sock.close()
+    raise SystemExit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
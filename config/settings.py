@@ -1,4 +1,6 @@
 import os
+from functools import lru_cache
+from typing import Optional
 
 from pydantic_settings import BaseSettings
 
@@ -8,10 +10,82 @@ class Settings(BaseSettings):
     model_max_tokens: int
     embedding_model: str
     vector_store_path: str
+    snapshot_interval_seconds: float = 60.0
+    vector_store_read_only: bool = False
+    embedding_cache_size: int = 10000
+    embedding_cache_path: Optional[str] = "embedding_cache.sqlite3"
+    rank_use_mmr: bool = False
+    mmr_lambda: float = 0.5
+    vector_index_type: str = "flat_ip"
+    hnsw_m: int = 32
+    hnsw_ef_search: int = 64
+    ivf_nlist: int = 1024
+    ivf_nprobe: int = 16
+    pq_m: int = 16
+    index_migrate_threshold: int = 100000
+    blocking_pool_size: int = 8
+    retrieval_candidate_k: int = 20
+    retrieval_min_score: float = 0.3
+    retrieval_dedupe_threshold: float = 0.95
+    retrieval_mode: str = "hybrid"
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.95
+    semantic_cache_ttl_seconds: float = 24 * 3600
+    semantic_cache_max_entries: int = 5000
+    metrics_enabled: bool = False
+    request_tracing_enabled: bool = False
+    admission_tokens_per_minute: int = 300000
+    admission_max_concurrency: int = 16
+    admission_max_queue_length: int = 64
+    admission_small_request_tokens: int = 4000
+    admission_max_wait_seconds: float = 30.0
+    batch_workers: int = 8
+    sse_flush_interval_seconds: float = 0.05
+    sse_max_buffer_chars: int = 256
+    sse_heartbeat_seconds: float = 15.0
+    sse_disconnect_poll_seconds: float = 0.5
+    ingestion_workers: int = 4
+    ingestion_batch_size: int = 256
+    ingestion_chunk_tokens: int = 512
+    ingestion_overlap_tokens: int = 64
+    indexing_queue_max_chunks: int = 10000
+    indexing_batch_size: int = 256
+    indexing_flush_seconds: float = 0.05
+    openai_base_url: Optional[str] = None
+    openai_max_connections: int = 100
+    openai_max_keepalive_connections: int = 20
+    openai_http2: bool = True
+    openai_max_concurrency: int = 32
+    openai_max_retries: int = 4
+    openai_timeout_seconds: float = 60.0
+    circuit_failure_threshold: int = 5
+    circuit_reset_seconds: float = 30.0
+    embedding_batch_window_seconds: float = 0.01
+    embedding_max_batch_inputs: int = 1000
+    embedding_max_batch_tokens: int = 250000
+    summary_concurrency: int = 4
+    summary_max_output_tokens: int = 1024
+    summary_cache_size: int = 256
+    summary_cache_ttl_seconds: Optional[float] = 7 * 24 * 3600
+    summary_cache_path: Optional[str] = "summary_cache.sqlite3"
 
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
-settings = Settings()
-os.environ["OPENAI_API_KEY"] = settings.openai_api_key
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Reads the settings on first use rather than at import, so importing the
+    application (e.g. a process manager before it forks workers) needs no
+    environment.
+    """
+    settings = Settings()
+    os.environ["OPENAI_API_KEY"] = settings.openai_api_key
+    return settings
+
+def __getattr__(name: str):
+    # Keeps `from config.settings import settings` working, it now reads the settings lazily
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
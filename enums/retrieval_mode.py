@@ -0,0 +1,6 @@
+from enum import Enum
+
+class RetrievalMode(Enum):
+    DENSE = "dense"
+    LEXICAL = "lexical"
+    HYBRID = "hybrid"
\ No newline at end of file
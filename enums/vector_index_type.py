@@ -0,0 +1,7 @@
+from enum import Enum
+
+class VectorIndexType(Enum):
+    FLAT_L2 = "flat_l2"
+    FLAT_IP = "flat_ip"
+    HNSW = "hnsw"
+    IVF_PQ = "ivf_pq"
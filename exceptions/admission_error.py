@@ -0,0 +1,12 @@
+from typing import Optional
+
+
+class AdmissionRejectedError(Exception):
+    """
+    Raised when a request cannot be admitted because the queue is full or it
+    waited too long for token or concurrency budget.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,19 @@
+from typing import Optional
+
+
+class UpstreamError(Exception):
+    """
+    Raised when a call to the model provider fails after retries.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UpstreamTimeoutError(UpstreamError):
+    pass
+
+
+class CircuitOpenError(UpstreamError):
+    pass
@@ -1,11 +1,45 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from config.settings import get_settings
+from exceptions.admission_error import AdmissionRejectedError
+from exceptions.upstream_error import UpstreamError
 from routers.question import router as question_router
+from routers.documents import router as documents_router
 from routers.health import router as health_router
+from routers.metrics import router as metrics_router
+from services.service_registry import ServiceRegistry
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    registry = ServiceRegistry(get_settings())
+    await registry.start()
+    app.state.service_registry = registry
+    try:
+        yield
+    finally:
+        await registry.stop()
 
 app = FastAPI(
     title="AI Planner Service",
     version="1.0",
+    lifespan=lifespan,
 )
 
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, exc: UpstreamError):
+    headers = {"Retry-After": str(int(exc.retry_after))} if exc.retry_after else None
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=headers)
+
+@app.exception_handler(AdmissionRejectedError)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejectedError):
+    headers = {"Retry-After": str(int(exc.retry_after))} if exc.retry_after else None
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers=headers)
+
 app.include_router(question_router, prefix="/api", tags=["Question"])
-app.include_router(health_router, prefix="", tags=["Health"])
\ No newline at end of file
+app.include_router(documents_router, prefix="/api", tags=["Documents"])
+app.include_router(health_router, prefix="", tags=["Health"])
+app.include_router(metrics_router, prefix="", tags=["Metrics"])
@@ -0,0 +1,14 @@
+from models.document_ingest_response import DocumentIngestResponse
+from services.ingestion_service import IngestionReport
+
+
+class IngestionMapper:
+    @staticmethod
+    def to_ingest_response(report: IngestionReport) -> DocumentIngestResponse:
+        return DocumentIngestResponse(
+            documents=report.documents,
+            chunks=report.chunks,
+            indexed_chunks=report.indexed_chunks,
+            seconds=round(report.seconds, 3),
+            chunks_per_second=round(report.chunks_per_second, 3)
+        )
@@ -0,0 +1,9 @@
+from typing import Optional
+from pydantic import Field
+from models.question_request import QuestionRequest
+
+class BatchQuestionItem(QuestionRequest):
+    id: Optional[str] = Field(
+        default=None,
+        description="Item identifier echoed in its result, defaults to the line number"
+    )
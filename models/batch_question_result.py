@@ -0,0 +1,26 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+
+class BatchQuestionResult(BaseModel):
+    id: str = Field(
+        ...,
+        description="Identifier of the batch item"
+    )
+    reply: str = Field(
+        default="",
+        description="Complete LLM generated reply"
+    )
+    input_tokens: int = Field(
+        default=0,
+        ge=0,
+        description="Number of input tokens"
+    )
+    output_tokens: int = Field(
+        default=0,
+        ge=0,
+        description="Number of output tokens"
+    )
+    error: Optional[str] = Field(
+        default=None,
+        description="Why the item failed, None when it succeeded"
+    )
@@ -0,0 +1,9 @@
+from typing import List
+from pydantic import BaseModel, Field
+from models.document import Document
+
+class DocumentIngestRequest(BaseModel):
+    documents: List[Document] = Field(
+        ...,
+        description="Documents to add to the knowledge base"
+    )
@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field
+
+class DocumentIngestResponse(BaseModel):
+    documents: int = Field(
+        ...,
+        ge=0,
+        description="Number of documents ingested"
+    )
+    chunks: int = Field(
+        ...,
+        ge=0,
+        description="Number of chunks produced from the documents"
+    )
+    indexed_chunks: int = Field(
+        ...,
+        ge=0,
+        description="Number of chunks added, excluding content already in the knowledge base"
+    )
+    seconds: float = Field(
+        ...,
+        ge=0,
+        description="Time spent ingesting"
+    )
+    chunks_per_second: float = Field(
+        ...,
+        ge=0,
+        description="Ingestion throughput"
+    )
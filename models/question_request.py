@@ -1,5 +1,6 @@
 from typing import List, Optional
 from pydantic import BaseModel, Field
+from enums.retrieval_mode import RetrievalMode
 from models.document import Document
 
 class QuestionRequest(BaseModel):
@@ -20,3 +21,26 @@ class QuestionRequest(BaseModel):
         gt=0,
         description="Maximum number of tokens for LLM output"
     )
+    top_k: Optional[int] = Field(
+        default=None,
+        gt=0,
+        description="Maximum number of context chunks, overrides the service default"
+    )
+    min_relevance: Optional[float] = Field(
+        default=None,
+        ge=0,
+        le=1,
+        description="Minimum relevance score for knowledge base chunks, overrides the service default"
+    )
+    retrieval_mode: Optional[RetrievalMode] = Field(
+        default=None,
+        description="Knowledge base retrieval: dense, lexical (BM25, no embedding call) or hybrid, overrides the service default"
+    )
+    tenant_id: Optional[str] = Field(
+        default=None,
+        description="Tenant or user the request belongs to, scopes cached answers"
+    )
+    use_cache: bool = Field(
+        default=True,
+        description="Allow answering from the semantic response cache when it is enabled"
+    )
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 
 @dataclass
@@ -7,3 +7,4 @@ class RAGChunk:
     id: str
     content: str
     metadata: Dict[str, Any]
+    score: Optional[float] = None  # Relevance to the query, set by retrieval and ranking
@@ -0,0 +1,95 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+
+@dataclass
+class TokenizedText:
+    text: str
+    tokens: array  # Token ids, packed as unsigned 32-bit ints
+    offsets: array  # Character offset in text where each token starts
+
+    @classmethod
+    def from_lists(cls, text: str, tokens: List[int], offsets: List[int]) -> "TokenizedText":
+        # Packed arrays take 4-8 bytes per token instead of a Python int object each
+        return cls(text=text, tokens=array("I", tokens), offsets=array("q", offsets))
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def char_offset(self, token_index: int) -> int:
+        if token_index >= len(self.offsets):
+            return len(self.text)
+        return self.offsets[token_index]
+
+    def token_index(self, char_offset: int) -> int:
+        return bisect_left(self.offsets, char_offset)
+
+    def containing_token_index(self, char_offset: int) -> int:
+        return max(0, bisect_right(self.offsets, char_offset) - 1)
+
+    def slice(self, start: int, end: int) -> str:
+        # Decoding is a plain string slice of the original text
+        return self.text[self.char_offset(start):self.char_offset(end)]
+
+    def _char_span_to_tokens(self, start: int, end: int) -> Tuple[int, int]:
+        # A token may start with the whitespace stripped from the span, so the
+        # first token is the one containing start rather than the next one
+        return self.containing_token_index(start), self.token_index(end)
+
+    def paragraph_spans(self) -> Iterator[Tuple[int, int]]:
+        """
+        Token ranges of the non-empty paragraphs (blocks separated by a blank line).
+        """
+        position = 0
+        previous_end = 0
+        text_len = len(self.text)
+
+        while position <= text_len:
+            separator = self.text.find("\n\n", position)
+            end = text_len if separator == -1 else separator
+
+            start_char, end_char = _strip_span(self.text, position, end)
+            if start_char < end_char:
+                token_start, token_end = self._char_span_to_tokens(start_char, end_char)
+                token_start = max(token_start, previous_end)
+                if token_start < token_end:
+                    yield token_start, token_end
+                    previous_end = token_end
+
+            if separator == -1:
+                break
+            position = separator + 2
+
+    def sentence_spans(self, token_start: int, token_end: int) -> Iterator[Tuple[int, int]]:
+        """
+        Token ranges of the sentences inside a token range.
+        """
+        start_char = self.char_offset(token_start)
+        end_char = self.char_offset(token_end)
+
+        previous_end = token_start
+        sentence_start = start_char
+        boundaries = [m.span() for m in SENTENCE_BOUNDARY.finditer(self.text, start_char, end_char)]
+        boundaries.append((end_char, end_char))
+
+        for boundary_start, boundary_end in boundaries:
+            span_start, span_end = self._char_span_to_tokens(sentence_start, boundary_start)
+            span_start = max(span_start, previous_end)
+            span_end = min(span_end, token_end)
+            if span_start < span_end:
+                yield span_start, span_end
+                previous_end = span_end
+            sentence_start = boundary_end
+
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
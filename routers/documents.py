@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from mappers.ingestion_mapper import IngestionMapper
+from models.document_ingest_request import DocumentIngestRequest
+from models.document_ingest_response import DocumentIngestResponse
+from services.ingestion_service import DocumentIngestionService
+from services.providers import get_ingestion_service
+
+router = APIRouter()
+
+@router.post(
+    "/documents",
+    summary="Add documents to the knowledge base",
+    response_model=DocumentIngestResponse
+)
+async def ingest_documents(
+        request: DocumentIngestRequest,
+        ingestion_service: DocumentIngestionService = Depends(get_ingestion_service)
+):
+    if ingestion_service.rag_service.read_only:
+        raise HTTPException(status_code=409, detail="The knowledge base is read-only in this worker, "
+                                                    "ingest with python -m cli.ingest_documents.")
+    report = await ingestion_service.ingest(request.documents)
+    return IngestionMapper.to_ingest_response(report)
@@ -1,4 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+
+from services.providers import get_service_registry
+from services.service_registry import ServiceRegistry
 
 router = APIRouter()
 
@@ -6,3 +9,13 @@ router = APIRouter()
 async def awake_service():
     return {"status": "alive"}
 
+@router.get("/stats")
+async def service_stats(registry: ServiceRegistry = Depends(get_service_registry)):
+    return {
+        "embedding_cache": registry.embedding_client.stats(),
+        "embedding_dispatcher": registry.embedding_dispatcher.stats(),
+        "summary_cache": registry.summary_cache.stats(),
+        "semantic_cache": registry.semantic_cache.stats() if registry.semantic_cache else None,
+        "indexing_queue": registry.indexing_queue.stats(),
+        "admission": registry.admission_controller.stats(),
+    }
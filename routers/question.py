@@ -1,9 +1,11 @@
-import json
-
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
 from starlette.responses import StreamingResponse
+from config.settings import get_settings
 from models.question_request import QuestionRequest
-from services.providers import get_question_service
+from services.admission_controller import AdmissionController
+from services.batch_question_service import BatchQuestionService, parse_batch_items
+from services.providers import get_admission_controller, get_batch_question_service, get_question_service
+from services.question_event_stream import EventStreamResponse, QuestionEventStream
 from services.question_service import QuestionService
 
 router = APIRouter()
@@ -12,15 +14,49 @@ router = APIRouter()
     "/ask",
     summary="Ask a question"
 )
-def ask_question(
+async def ask_question(
         request: QuestionRequest,
-        question_service: QuestionService = Depends(get_question_service)
+        http_request: Request,
+        question_service: QuestionService = Depends(get_question_service),
+        admission_controller: AdmissionController = Depends(get_admission_controller)
+):
+    # Admission happens before the response starts, so a rejection can still be a 429
+    user = request.tenant_id or (http_request.client.host if http_request.client else "anonymous")
+    ticket = await admission_controller.acquire(user, question_service.estimate_tokens(request))
+
+    settings = get_settings()
+    event_stream = QuestionEventStream(
+        question_service.handle_question(request),
+        is_disconnected=http_request.is_disconnected,
+        flush_interval_seconds=settings.sse_flush_interval_seconds,
+        max_buffer_chars=settings.sse_max_buffer_chars,
+        heartbeat_seconds=settings.sse_heartbeat_seconds,
+        disconnect_poll_seconds=settings.sse_disconnect_poll_seconds
+    )
+
+    # Proxies must not buffer the stream, or coalescing and heartbeats are lost
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    # The response owns the slot from here on and frees it when it ends, even if it never starts
+    return EventStreamResponse(event_stream, on_close=ticket.release, headers=headers)
+
+@router.post(
+    "/ask/batch",
+    summary="Answer a JSONL batch of questions"
+)
+async def ask_batch(
+        http_request: Request,
+        batch_service: BatchQuestionService = Depends(get_batch_question_service)
 ):
-    generator = question_service.handle_question(request)
+    # One QuestionRequest per line, optionally with an "id"; results are streamed back
+    # as JSONL in completion order, so a client can resubmit only the ids it did not get
+    body = (await http_request.body()).decode("utf-8")
+    try:
+        items = parse_batch_items(body.splitlines())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-    async def event_stream():
-        for dto in generator:
-            json_str = json.dumps(dto.dict(), ensure_ascii=False)
-            yield f"data: {json_str}\n\n"
+    async def lines():
+        async for result in batch_service.run(items):
+            yield result.model_dump_json() + "\n"
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
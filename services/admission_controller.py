@@ -0,0 +1,186 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from exceptions.admission_error import AdmissionRejectedError
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    virtual_start: float
+    sequence: int
+    user: str = field(compare=False)
+    cost: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class AdmissionTicket:
+    """
+    Held while an admitted request runs. Releasing it frees a concurrency slot;
+    the tokens stay spent and come back at the tokens-per-minute rate.
+    """
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+
+class AdmissionController:
+    """
+    Admits requests against a tokens-per-minute bucket and a concurrency limit.
+    Waiting requests are served small-first, then by start-time fair queuing on
+    estimated tokens so one user's burst cannot starve the others. Requests are
+    rejected with a Retry-After hint when the queue is full or the wait exceeds
+    max_wait_seconds. Used from the event loop only, so it needs no locking.
+    """
+
+    def __init__(
+            self,
+            tokens_per_minute: int = 300_000,
+            max_concurrency: int = 16,
+            max_queue_length: int = 64,
+            small_request_tokens: int = 4000,
+            max_wait_seconds: float = 30.0):
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.max_queue_length = max_queue_length
+        self.small_request_tokens = small_request_tokens
+        self.max_wait_seconds = max_wait_seconds
+
+        self._rate = tokens_per_minute / 60
+        self._tokens = float(tokens_per_minute)
+        self._updated_at = time.monotonic()
+        self._active = 0
+        self._heap: List[_Waiter] = []
+        self._waiting = 0
+        self._queued_tokens = 0
+        self._virtual_time = 0.0
+        self._user_finish: Dict[str, float] = {}
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def queue_length(self) -> int:
+        return self._waiting
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    async def acquire(self, user: str, estimated_tokens: int) -> AdmissionTicket:
+        # A request larger than the whole bucket would never fit, it waits for a full bucket instead
+        cost = max(1, min(estimated_tokens, self.tokens_per_minute))
+        self._refill()
+
+        if self._waiting == 0 and self._active < self.max_concurrency and self._tokens >= cost:
+            self._start(cost)
+            return AdmissionTicket(self)
+
+        if self._waiting >= self.max_queue_length:
+            self._reject("Too many requests are waiting, try again later.", cost)
+
+        virtual_start = max(self._virtual_time, self._user_finish.get(user, 0.0))
+        self._user_finish[user] = virtual_start + cost
+        waiter = _Waiter(
+            priority=0 if cost <= self.small_request_tokens else 1,
+            virtual_start=virtual_start,
+            sequence=next(self._sequence),
+            user=user,
+            cost=cost,
+            future=asyncio.get_running_loop().create_future()
+        )
+        heapq.heappush(self._heap, waiter)
+        self._waiting += 1
+        self._queued_tokens += cost
+        self._dispatch()
+
+        try:
+            async with asyncio.timeout(self.max_wait_seconds):
+                await asyncio.shield(waiter.future)
+        except BaseException as e:
+            if waiter.future.done():
+                # Admitted while the wait was being abandoned
+                if isinstance(e, TimeoutError):
+                    return AdmissionTicket(self)
+                self._release()
+                raise
+            waiter.future.cancel()
+            self._waiting -= 1
+            self._queued_tokens -= cost
+            if isinstance(e, TimeoutError):
+                self._reject("Timed out waiting for capacity, try again later.", cost)
+            raise
+
+        return AdmissionTicket(self)
+
+    def _reject(self, message: str, cost: int) -> None:
+        self.rejected += 1
+        wait = (self._queued_tokens + cost - self._tokens) / self._rate
+        raise AdmissionRejectedError(message, retry_after=max(1, math.ceil(wait)))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.tokens_per_minute, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    def _start(self, cost: int) -> None:
+        self._active += 1
+        self._tokens -= cost
+        self.admitted += 1
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._refill()
+
+        while self._heap:
+            head = self._heap[0]
+            if head.future.done():
+                heapq.heappop(self._heap)  # Abandoned wait, already taken off the counters
+                continue
+            if self._active >= self.max_concurrency:
+                return
+            if self._tokens < head.cost:
+                # Wake up when the bucket holds enough for the head of the queue
+                delay = (head.cost - self._tokens) / self._rate
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            heapq.heappop(self._heap)
+            self._waiting -= 1
+            self._queued_tokens -= head.cost
+            self._virtual_time = max(self._virtual_time, head.virtual_start)
+            self._start(head.cost)
+            head.future.set_result(None)
+
+        # Users whose share is fully served no longer need a finish time
+        if len(self._user_finish) > 10_000:
+            self._user_finish = {u: f for u, f in self._user_finish.items() if f > self._virtual_time}
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "queued_tokens": self._queued_tokens,
+            "available_tokens": int(self._tokens),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from pydantic import ValidationError
+
+from exceptions.admission_error import AdmissionRejectedError
+from models.batch_question_item import BatchQuestionItem
+from models.batch_question_result import BatchQuestionResult
+from services.admission_controller import AdmissionController
+from services.question_service import QuestionService
+from services.rag_service import content_hash
+
+logger = logging.getLogger(__name__)
+
+
+def parse_batch_items(lines: Iterable[str]) -> List[BatchQuestionItem]:
+    """
+    Reads one question per JSONL line. Items without an id get their line
+    number; a malformed line or a repeated id raises ValueError.
+    """
+    items: List[BatchQuestionItem] = []
+    seen: set[str] = set()
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            item = BatchQuestionItem.model_validate_json(line)
+        except ValidationError as e:
+            raise ValueError(f"Line {line_number}: {e}") from e
+
+        item.id = item.id or str(line_number)
+        if item.id in seen:
+            raise ValueError(f"Line {line_number}: duplicate id {item.id!r}")
+        seen.add(item.id)
+        items.append(item)
+    return items
+
+
+class BatchQuestionService:
+    """
+    Answers a batch of questions with a pool of workers and yields results as
+    they finish. Every item goes through admission control, so the batch runs
+    as fast as the token and concurrency budgets allow and waits instead of
+    failing when they are exhausted. An attachment shared by several items is
+    prepared by the first of them; the others start after it and reuse its
+    cached summary and embeddings. Concurrent items also share embedding
+    batches through the dispatcher.
+    """
+
+    BATCH_USER = "batch"
+
+    def __init__(
+            self,
+            question_service: QuestionService,
+            admission_controller: Optional[AdmissionController] = None,
+            workers: int = 8):
+        self.question_service = question_service
+        self.admission_controller = admission_controller
+        self.workers = workers
+
+    @staticmethod
+    def _schedule(items: List[BatchQuestionItem]) -> List[tuple[BatchQuestionItem, List[str], List[str]]]:
+        # Items that first bring an attachment go first, items that only reuse attachments after them.
+        # An item waits only for items scheduled before it, so workers can never wait on each other in a cycle.
+        leaders, followers = [], []
+        owners: Dict[str, str] = {}
+        for item in items:
+            keys = {content_hash(attachment.content) for attachment in item.attachments or []}
+            led = [key for key in keys if key not in owners]
+            for key in led:
+                owners[key] = item.id
+            waits = [key for key in keys if owners[key] != item.id]
+            (leaders if led or not keys else followers).append((item, led, waits))
+        return leaders + followers
+
+    async def run(self, items: List[BatchQuestionItem]) -> AsyncIterator[BatchQuestionResult]:
+        schedule = self._schedule(items)
+        prepared: Dict[str, asyncio.Event] = {key: asyncio.Event() for _, led, _ in schedule for key in led}
+        pending: asyncio.Queue = asyncio.Queue()
+        for entry in schedule:
+            pending.put_nowait(entry)
+        results: asyncio.Queue[BatchQuestionResult] = asyncio.Queue()
+
+        async def work() -> None:
+            while not pending.empty():
+                item, led, waits = pending.get_nowait()
+                try:
+                    for key in waits:
+                        await prepared[key].wait()
+                    results.put_nowait(await self._answer(item))
+                finally:
+                    # Followers proceed even when the leader failed, they then prepare the attachment themselves
+                    for key in led:
+                        prepared[key].set()
+
+        workers = [asyncio.create_task(work()) for _ in range(min(self.workers, len(schedule)))]
+        try:
+            for _ in range(len(schedule)):
+                yield await results.get()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _answer(self, item: BatchQuestionItem) -> BatchQuestionResult:
+        ticket = await self._admit(item) if self.admission_controller is not None else None
+        reply: List[str] = []
+        input_tokens = output_tokens = 0
+        try:
+            async for response in self.question_service.handle_question(item):
+                reply.append(response.reply)
+                input_tokens += response.input_tokens
+                output_tokens += response.output_tokens
+        except Exception as e:
+            logger.warning("Batch item %s failed: %s", item.id, e)
+            return BatchQuestionResult(id=item.id, error=str(e) or type(e).__name__)
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+        return BatchQuestionResult(id=item.id, reply="".join(reply),
+                                   input_tokens=input_tokens, output_tokens=output_tokens)
+
+    async def _admit(self, item: BatchQuestionItem):
+        estimated_tokens = self.question_service.estimate_tokens(item)
+        while True:
+            try:
+                return await self.admission_controller.acquire(item.tenant_id or self.BATCH_USER, estimated_tokens)
+            except AdmissionRejectedError as e:
+                # Offline work has no client to give up, it waits for the hinted retry time
+                await asyncio.sleep(e.retry_after)
@@ -0,0 +1,120 @@
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from models.llm_request import LLMRequest
+from models.rag_chunk import RAGChunk
+from services.text_preprocessing_service import TextPreprocessingService
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENTS_HEADER = "\n\nUser-provided attachments:\n"
+CONTEXT_HEADER = "\n\nUser context:\n"
+KB_HEADER = "\n\nRelevant knowledge base data:\n"
+
+
+@dataclass
+class PackedContext:
+    instructions: str
+    input_tokens: int  # Estimated tokens of instructions plus user prompt
+    attachment_chunks: List[RAGChunk] = field(default_factory=list)
+    kb_chunks: List[RAGChunk] = field(default_factory=list)
+    truncated_chunks: int = 0
+    dropped_chunks: int = 0
+
+
+def render_instructions(
+        system_prompt: str,
+        attachment_chunks: Optional[List[RAGChunk]],
+        context: Optional[str],
+        kb_chunks: Optional[List[RAGChunk]]) -> str:
+    parts = [system_prompt]
+
+    if attachment_chunks:
+        parts.append(ATTACHMENTS_HEADER)
+        for i, chunk in enumerate(attachment_chunks, start=1):
+            parts.append(f"\n[Attachment {i}]\n{chunk.content}\n")
+
+    if context:
+        parts.append(f"{CONTEXT_HEADER}{context}\n")
+
+    if kb_chunks:
+        parts.append(KB_HEADER)
+        for i, chunk in enumerate(kb_chunks, start=1):
+            parts.append(f"\n[KB {i}]\n{chunk.content}\n")
+
+    return "".join(parts)
+
+
+class ContextPacker:
+    """
+    Fits the prompt into the context window: model_max_tokens minus the output
+    budget, the system prompt and the user prompt. The user context is kept
+    first, then attachment and knowledge base chunks are packed in ranked order.
+    A chunk that does not fit is truncated, or dropped together with everything
+    ranked below it once less than min_chunk_tokens remain.
+    """
+
+    def __init__(self, text_preprocessing_service: TextPreprocessingService, min_chunk_tokens: int = 64):
+        self.text_preprocessing_service = text_preprocessing_service
+        self.min_chunk_tokens = min_chunk_tokens
+
+    def _count(self, text: str) -> int:
+        return self.text_preprocessing_service._estimate_tokens(text)
+
+    def pack(self, request: LLMRequest) -> PackedContext:
+        tps = self.text_preprocessing_service
+        fixed_tokens = self._count(request.system_prompt) + self._count(request.user_prompt)
+        available = tps.model_max_tokens - request.max_output_tokens - tps.safety_buffer_tokens
+        remaining = available - fixed_tokens
+
+        context = request.context
+        if context:
+            context, used, _ = self._fit(context, remaining - self._count(CONTEXT_HEADER))
+            remaining -= used + self._count(CONTEXT_HEADER)
+
+        packed = PackedContext(instructions="", input_tokens=0)
+
+        for source, target, label, header in (
+                (request.attachment_chunks, packed.attachment_chunks, "Attachment", ATTACHMENTS_HEADER),
+                (request.kb_chunks, packed.kb_chunks, "KB", KB_HEADER)):
+            if not source:
+                continue
+
+            remaining -= self._count(header)
+            for i, chunk in enumerate(source, start=1):
+                remaining -= self._count(f"\n[{label} {i}]\n\n")
+                content, used, truncated = self._fit(chunk.content, remaining)
+                if not content:
+                    packed.dropped_chunks += len(source) - i + 1
+                    break
+
+                remaining -= used
+                packed.truncated_chunks += truncated
+                target.append(chunk if not truncated else RAGChunk(
+                    id=chunk.id,
+                    content=content,
+                    metadata={**chunk.metadata, "truncated": True}
+                ))
+
+        packed.instructions = render_instructions(
+            request.system_prompt, packed.attachment_chunks, context, packed.kb_chunks
+        )
+        # Everything packed was counted on the way, so the rendered prompt is not encoded again
+        packed.input_tokens = available - remaining
+
+        logger.debug(
+            "Packed context: ~%d input tokens, %d chunks truncated, %d dropped",
+            packed.input_tokens, packed.truncated_chunks, packed.dropped_chunks
+        )
+        return packed
+
+    def _fit(self, text: str, budget: int) -> tuple[str, int, bool]:
+        encoder = self.text_preprocessing_service.encoder
+        tokens = encoder.encode(text)
+
+        if len(tokens) <= budget:
+            return text, len(tokens), False
+        if budget < self.min_chunk_tokens:
+            return "", 0, False
+        return encoder.decode(tokens[:budget]), budget, True
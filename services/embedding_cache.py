@@ -0,0 +1,153 @@
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from services.embedding_dispatcher import EmbeddingDispatcher
+from utils.blocking_pool import run_blocking
+from utils.lru_cache import LRUCache
+from utils.sqlite_kv_store import SqliteKVStore
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed cache in front of an embedding client.
+    Entries are keyed by (embedding model, sha256(text)) and looked up in an
+    in-process LRU first, then in a local SQLite store, before calling the API.
+    """
+
+    def __init__(
+            self,
+            embedding_client: Embeddings,
+            model: str,
+            memory_size: int = 10000,
+            disk_store: Optional[SqliteKVStore] = None,
+            dispatcher: Optional[EmbeddingDispatcher] = None):
+        self.embedding_client = embedding_client
+        self.dispatcher = dispatcher
+        self.model = model
+        self.memory = LRUCache(max_size=memory_size)
+        self.disk_store = disk_store
+
+        self._stats_lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model}:{digest}"
+
+    def _lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        memory_hits = 0
+        disk_hits = 0
+
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+                memory_hits += 1
+
+        remaining = [k for k in keys if k not in found]
+        if remaining and self.disk_store is not None:
+            for key, blob in self.disk_store.get_many(remaining).items():
+                vector = np.frombuffer(blob, dtype=np.float32)
+                self.memory.put(key, vector)
+                found[key] = vector
+                disk_hits += 1
+
+        with self._stats_lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += disk_hits
+
+        return found
+
+    def _store(self, items: Dict[str, np.ndarray]) -> None:
+        for key, vector in items.items():
+            self.memory.put(key, vector)
+
+        if self.disk_store is not None and items:
+            self.disk_store.put_many((key, vector.tobytes()) for key, vector in items.items())
+
+    def _partition(self, texts: List[str]) -> tuple[List[str], Dict[str, np.ndarray], Dict[str, str]]:
+        keys = [self._key(t) for t in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        # Embed each distinct missing text once, even if repeated in the batch
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            with self._stats_lock:
+                self.misses += len(missing)
+
+        return keys, found, missing
+
+    @staticmethod
+    def _to_arrays(keys, vectors) -> Dict[str, np.ndarray]:
+        return {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(keys, vectors)}
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeds texts into a single (len(texts), dim) float32 matrix.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        keys, found, missing = self._partition(texts)
+        if missing:
+            computed = self._to_arrays(missing.keys(), self.embedding_client.embed_documents(list(missing.values())))
+            self._store(computed)
+            found.update(computed)
+
+        return np.stack([found[k] for k in keys])
+
+    async def aembed_matrix(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        keys, found, missing = await run_blocking(self._partition, texts)
+        if missing:
+            texts_to_embed = list(missing.values())
+            if self.dispatcher is not None:
+                vectors = await self.dispatcher.embed(texts_to_embed)
+            else:
+                vectors = await self.embedding_client.aembed_documents(texts_to_embed)
+            computed = self._to_arrays(missing.keys(), vectors)
+            await run_blocking(self._store, computed)
+            found.update(computed)
+
+        return np.stack([found[k] for k in keys])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_matrix([text])[0].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return (await self.aembed_matrix(texts)).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_matrix([text]))[0].tolist()
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / total if total else 0.0,
+                "memory_entries": len(self.memory),
+            }
@@ -0,0 +1,155 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+
+def approximate_tokens(text: str) -> int:
+    # Conservative for English (~4 characters per token), without running a tokenizer on the event loop
+    return len(text) // 3 + 1
+
+
+@dataclass
+class _PendingCall:
+    texts: List[str]
+    future: asyncio.Future
+    tokens: int = 0
+
+
+@dataclass
+class _Batch:
+    texts: List[str] = field(default_factory=list)
+    tokens: int = 0
+
+
+class EmbeddingDispatcher:
+    """
+    Coalesces embedding calls made by concurrent requests within a short window
+    into shared API requests. Pending texts are deduplicated and split into
+    batches bounded by input count and estimated tokens, the batches are sent
+    concurrently and results are fanned back out to each caller.
+    """
+
+    def __init__(
+            self,
+            embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+            window_seconds: float = 0.01,
+            max_batch_inputs: int = 1000,
+            max_batch_tokens: int = 250_000,
+            count_tokens: Callable[[str], int] = approximate_tokens):
+        self.embed_batch = embed_batch
+        self.window_seconds = window_seconds
+        self.max_batch_inputs = max_batch_inputs
+        self.max_batch_tokens = max_batch_tokens
+        self.count_tokens = count_tokens
+
+        self._pending: List[_PendingCall] = []
+        self._pending_tokens = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: set[asyncio.Task] = set()
+
+        self.requests_sent = 0
+        self.texts_embedded = 0
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        loop = asyncio.get_running_loop()
+        call = _PendingCall(
+            texts=texts,
+            future=loop.create_future(),
+            tokens=sum(self.count_tokens(t) for t in texts)
+        )
+        self._pending.append(call)
+        self._pending_tokens += call.tokens
+
+        if self._pending_tokens >= self.max_batch_tokens:
+            # Enough work for a full request, no reason to wait for the window
+            self._schedule_flush(loop, 0)
+        elif self._flush_handle is None:
+            self._schedule_flush(loop, self.window_seconds)
+
+        return await call.future
+
+    def _schedule_flush(self, loop: asyncio.AbstractEventLoop, delay: float) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self) -> None:
+        # The loop only keeps weak references to tasks, so in-flight flushes are held here until they finish
+        task = asyncio.get_running_loop().create_task(self._flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def close(self) -> None:
+        """Sends whatever is still pending and waits for every flush in flight."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending:
+            self._start_flush()
+        await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+
+    async def _flush(self) -> None:
+        self._flush_handle = None
+        calls, self._pending = self._pending, []
+        self._pending_tokens = 0
+        if not calls:
+            return
+
+        # The same chunk requested by several callers is embedded once
+        unique_texts = list(dict.fromkeys(t for call in calls for t in call.texts))
+        batches = self._split(unique_texts)
+
+        try:
+            results = await asyncio.gather(*(self.embed_batch(b.texts) for b in batches), return_exceptions=True)
+        except asyncio.CancelledError:
+            # Callers would otherwise wait forever on futures nobody is left to resolve
+            for call in calls:
+                if not call.future.done():
+                    call.future.set_exception(RuntimeError("Embedding dispatcher flush was cancelled."))
+            raise
+        self.requests_sent += len(batches)
+        self.texts_embedded += len(unique_texts)
+
+        vectors: Dict[str, List[float]] = {}
+        errors: Dict[str, BaseException] = {}
+        for batch, result in zip(batches, results):
+            if isinstance(result, BaseException):
+                errors.update((t, result) for t in batch.texts)
+            else:
+                vectors.update(zip(batch.texts, result))
+
+        for call in calls:
+            if call.future.done():
+                continue  # Caller was cancelled
+            error = next((errors[t] for t in call.texts if t in errors), None)
+            if error is not None:
+                call.future.set_exception(error)
+            else:
+                call.future.set_result([vectors[t] for t in call.texts])
+
+    def _split(self, texts: Sequence[str]) -> List[_Batch]:
+        batches: List[_Batch] = []
+        current = _Batch()
+
+        for text in texts:
+            tokens = self.count_tokens(text)
+            if current.texts and (len(current.texts) >= self.max_batch_inputs
+                                  or current.tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current = _Batch()
+            current.texts.append(text)
+            current.tokens += tokens
+
+        if current.texts:
+            batches.append(current)
+        return batches
+
+    def stats(self) -> dict:
+        return {
+            "requests_sent": self.requests_sent,
+            "texts_embedded": self.texts_embedded,
+            "pending_calls": len(self._pending),
+        }
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import List, Optional
+
+from models.rag_chunk import RAGChunk
+from services.rag_service import RAGService, content_hash
+
+logger = logging.getLogger(__name__)
+
+
+class IndexingQueue:
+    """
+    Bounded background queue that adds attachment chunks to the knowledge base
+    off the request path. Chunks from concurrent requests are inserted in shared
+    batches, content that is already pending or indexed is skipped, and
+    submitters wait when the queue is full. stop() drains what is left.
+    """
+
+    def __init__(
+            self,
+            rag_service: RAGService,
+            max_pending_chunks: int = 10000,
+            batch_size: int = 256,
+            flush_interval_seconds: float = 0.05):
+        self.rag_service = rag_service
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self._queue: asyncio.Queue[RAGChunk] = asyncio.Queue(maxsize=max_pending_chunks)
+        self._pending: set[str] = set()
+        self._worker: Optional[asyncio.Task] = None
+        self.indexed = 0
+        self.skipped = 0
+        self.failed = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run(), name="indexing-queue")
+
+    async def stop(self) -> None:
+        if self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def submit(self, chunks: List[RAGChunk]) -> None:
+        for chunk in chunks:
+            key = content_hash(chunk.content)
+            if key in self._pending or self.rag_service.has_content_hash(key):
+                self.skipped += 1
+                continue
+            self._pending.add(key)
+            # Blocks only when the queue is full, slowing producers down to the indexing rate
+            await self._queue.put(chunk)
+
+    async def _next_batch(self) -> List[RAGChunk]:
+        batch = [await self._queue.get()]
+        # Give concurrent requests a moment to contribute to the same batch
+        if self._queue.qsize() < self.batch_size - 1:
+            await asyncio.sleep(self.flush_interval_seconds)
+
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                self.indexed += await self.rag_service.index_chunks(batch)
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("Background indexing of %d chunks failed.", len(batch))
+            finally:
+                for chunk in batch:
+                    self._pending.discard(content_hash(chunk.content))
+                    self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "indexed": self.indexed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+        }
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import AsyncIterable, Callable, Iterable, Optional
+
+from exceptions.upstream_error import UpstreamError
+from models.document import Document
+from services.rag_service import RAGService, content_hash
+from services.text_preprocessing_service import TextPreprocessingService
+from utils.blocking_pool import iterate_blocking
+
+
+@dataclass
+class IngestionReport:
+    documents: int = 0
+    skipped_documents: int = 0
+    chunks: int = 0
+    indexed_chunks: int = 0  # chunks minus content that was already in the knowledge base
+    seconds: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    @property
+    def documents_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds else 0.0
+
+
+class IngestionProgress:
+    """
+    Append-only record of the documents already ingested, so an interrupted
+    run can be restarted and skip them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._done: set[str] = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self._done = {line.rstrip("\n") for line in file if line.strip()}
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def key(document: Document) -> str:
+        return f"{document.fileName}:{content_hash(document.content)}"
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._done
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def mark_done(self, key: str) -> None:
+        self._done.add(key)
+        self._file.write(key + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class DocumentIngestionService:
+    """
+    Bulk loads documents into the knowledge base: chunk, skip content that is
+    already indexed, embed in batches and add to FAISS. The write-ahead log
+    makes the additions durable; snapshots are left to the periodic task.
+    Documents are processed by a pool of concurrent workers.
+    """
+
+    def __init__(
+            self,
+            text_preprocessing_service: TextPreprocessingService,
+            rag_service: RAGService,
+            workers: int = 4,
+            batch_size: int = 256,
+            chunk_tokens: int = 512,
+            overlap_tokens: int = 64):
+        self.text_preprocessing_service = text_preprocessing_service
+        self.rag_service = rag_service
+        self.workers = workers
+        self.batch_size = batch_size
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+
+    async def ingest(
+            self,
+            documents: Iterable[Document] | AsyncIterable[Document],
+            progress: Optional[IngestionProgress] = None,
+            on_document: Optional[Callable[[IngestionReport], None]] = None) -> IngestionReport:
+        report = IngestionReport()
+        queue: asyncio.Queue[Optional[Document]] = asyncio.Queue(maxsize=self.workers * 2)
+        start = time.perf_counter()
+
+        async def produce() -> None:
+            if isinstance(documents, AsyncIterable):
+                async for document in documents:
+                    await queue.put(document)
+            else:
+                # Reading documents (e.g. from disk) is blocking, so it runs on the pool
+                async for batch in iterate_blocking(iter(documents), self.workers):
+                    for document in batch:
+                        await queue.put(document)
+            for _ in range(self.workers):
+                await queue.put(None)
+
+        async def work() -> None:
+            while (document := await queue.get()) is not None:
+                await self._ingest_document(document, report, progress)
+                report.seconds = time.perf_counter() - start
+                if on_document is not None:
+                    on_document(report)
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(produce())
+                for _ in range(self.workers):
+                    group.create_task(work())
+        except* UpstreamError as errors:
+            # Surfaced as is, so the API still answers 503 rather than 500 for an ExceptionGroup
+            raise errors.exceptions[0] from None
+
+        report.seconds = time.perf_counter() - start
+        return report
+
+    async def _ingest_document(
+            self,
+            document: Document,
+            report: IngestionReport,
+            progress: Optional[IngestionProgress]) -> None:
+        key = IngestionProgress.key(document) if progress is not None else None
+        if key is not None and key in progress:
+            report.skipped_documents += 1
+            return
+
+        # Batches are embedded and inserted while the chunker produces the next ones
+        chunk_iterator = self.text_preprocessing_service.iter_chunks_by_size(
+            document.content, self.chunk_tokens, self.overlap_tokens
+        )
+        chunk_index = 0
+        async for batch in iterate_blocking(chunk_iterator, self.batch_size):
+            rag_chunks = self.rag_service.to_rag_chunks(batch, document.fileName, start_index=chunk_index)
+            chunk_index += len(batch)
+            report.chunks += len(rag_chunks)
+            report.indexed_chunks += await self.rag_service.index_chunks(rag_chunks)
+
+        report.documents += 1
+        if key is not None:
+            progress.mark_done(key)
@@ -1,112 +1,103 @@
-from openai import OpenAI
-from config.settings import settings
+from typing import AsyncIterator, Optional
+
+from config.settings import get_settings
 from models.llm_request import LLMRequest
 from models.llm_response import LLMResponse
+from services.context_packer import ContextPacker, render_instructions
+from services.openai_gateway import OpenAIGateway
+from utils.blocking_pool import run_blocking
+from utils.metrics import LLM_TOKENS
 
 class LLMService:
-    def __init__(self, api_key: str = None, model: str = "gpt-4"):
-        self.api_key = api_key or settings.openai_api_key
+    def __init__(
+            self,
+            api_key: str = None,
+            model: str = "gpt-4",
+            context_packer: Optional[ContextPacker] = None,
+            gateway: Optional[OpenAIGateway] = None):
+        self.api_key = api_key or get_settings().openai_api_key
         if not self.api_key:
             raise ValueError("OpenAI API key not found.")
         self.model = model
-        self.client = OpenAI(api_key=self.api_key)
-
-    def _build_instructions(self, request: LLMRequest) -> str:
-        instructions = request.system_prompt
-
-        if request.attachment_chunks:
-            instructions += "\n\nUser-provided attachments:\n"
-            for i, chunk in enumerate(request.attachment_chunks, start=1):
-                instructions += (
-                    f"\n[Attachment {i}]\n"
-                    f"{chunk.content}\n"
-                )
-
-        if request.context:
-            instructions += f"\n\nUser context:\n{request.context}\n"
-
-        if request.kb_chunks:
-            instructions += "\n\nRelevant knowledge base data:\n"
-            for i, chunk in enumerate(request.kb_chunks, start=1):
-                instructions += (
-                    f"\n[KB {i}]\n"
-                    f"{chunk.content}\n"
-                )
-
-        return instructions
-
-    def send_request(self, request: LLMRequest) -> LLMResponse:
-        try:
-            # Build instructions
-            instructions = self._build_instructions(request)
-
-            # Call Responses API
-            response = self.client.responses.create(
-                model=self.model,
-                instructions=instructions,
-                input=request.user_prompt,
-                temperature=request.temperature,
-                max_output_tokens=request.max_output_tokens,
-            )
-
-            # Extract answer and token usage
-            if hasattr(response, "output_text"):
-                answer_text = response.output_text.strip()
-            else:
-                answer_text = response.output[0].content[0].text.strip()
-
-            if hasattr(response, "usage") and response.usage:
-                input_tokens = getattr(response.usage, "input_tokens", 0)
-                output_tokens = getattr(response.usage, "output_tokens", 0)
-            else:
-                input_tokens = 0
-                output_tokens = 0
-
-            return LLMResponse(
-                answer=answer_text,
-                input_tokens=input_tokens,
-                output_tokens=output_tokens
-            )
-
-        except Exception as e:
-            return LLMResponse(
-                answer=f"Error calling OpenAI API: {e}",
-                input_tokens=0,
-                output_tokens=0
-            )
-
-    def stream_request(self, request: LLMRequest):
-        try:
-            # Build instructions
-            instructions = self._build_instructions(request)
-
-            # Streaming call to Responses API
-            stream = self.client.responses.create(
-                model=self.model,
-                instructions=instructions,
-                input=request.user_prompt,
-                temperature=request.temperature,
-                max_output_tokens=request.max_output_tokens,
-                stream=True
-            )
-
-            for event in stream:
-                # Text chunk event
-                if event.type == "response.output_text.delta":
-                    text_delta = event.delta
-                    if text_delta:
-                        yield LLMResponse(answer=text_delta, input_tokens=0, output_tokens=0)
-
-                # Completed event
-                elif event.type == "response.completed":
-                    usage = getattr(event.response, "usage", None)
-                    input_tokens = getattr(usage, "input_tokens", 0) if usage else 0
-                    output_tokens = getattr(usage, "output_tokens", 0) if usage else 0
-                    yield LLMResponse(answer="", input_tokens=input_tokens, output_tokens=output_tokens)
-
-        except Exception as e:
-            return LLMResponse(
-                answer=f"Error calling OpenAI API: {e}",
-                input_tokens=0,
-                output_tokens=0
-            )
+        self.gateway = gateway or OpenAIGateway(api_key=self.api_key)
+        self.client = self.gateway.client
+        self.context_packer = context_packer
+
+    async def _build_instructions(self, request: LLMRequest) -> tuple[str, int]:
+        # Returns the instructions and the packer's estimate of the input tokens (0 without a packer),
+        # which stands in for the usage the API did not report
+        if self.context_packer is None:
+            return render_instructions(
+                request.system_prompt, request.attachment_chunks, request.context, request.kb_chunks
+            ), 0
+
+        # Packing tokenizes every chunk, which would stall the event loop
+        packed = await run_blocking(self.context_packer.pack, request)
+        return packed.instructions, packed.input_tokens
+
+    async def send_request(self, request: LLMRequest) -> LLMResponse:
+        # Build instructions
+        instructions, estimated_input_tokens = await self._build_instructions(request)
+
+        # Call Responses API
+        response = await self.gateway.call(
+            self.client.responses.create,
+            model=self.model,
+            instructions=instructions,
+            input=request.user_prompt,
+            temperature=request.temperature,
+            max_output_tokens=request.max_output_tokens,
+        )
+
+        # Extract answer and token usage
+        if hasattr(response, "output_text"):
+            answer_text = response.output_text.strip()
+        else:
+            answer_text = response.output[0].content[0].text.strip()
+
+        if hasattr(response, "usage") and response.usage:
+            input_tokens = getattr(response.usage, "input_tokens", 0) or estimated_input_tokens
+            output_tokens = getattr(response.usage, "output_tokens", 0)
+        else:
+            input_tokens = estimated_input_tokens
+            output_tokens = 0
+
+        LLM_TOKENS.inc(input_tokens, call="send", direction="input")
+        LLM_TOKENS.inc(output_tokens, call="send", direction="output")
+
+        return LLMResponse(
+            answer=answer_text,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens
+        )
+
+    async def stream_request(self, request: LLMRequest) -> AsyncIterator[LLMResponse]:
+        # Build instructions
+        instructions, estimated_input_tokens = await self._build_instructions(request)
+
+        # Streaming call to Responses API
+        stream = self.gateway.stream(
+            self.client.responses.create,
+            model=self.model,
+            instructions=instructions,
+            input=request.user_prompt,
+            temperature=request.temperature,
+            max_output_tokens=request.max_output_tokens,
+            stream=True
+        )
+
+        async for event in stream:
+            # Text chunk event
+            if event.type == "response.output_text.delta":
+                text_delta = event.delta
+                if text_delta:
+                    yield LLMResponse(answer=text_delta, input_tokens=0, output_tokens=0)
+
+            # Completed event
+            elif event.type == "response.completed":
+                usage = getattr(event.response, "usage", None)
+                input_tokens = (getattr(usage, "input_tokens", 0) if usage else 0) or estimated_input_tokens
+                output_tokens = getattr(usage, "output_tokens", 0) if usage else 0
+                LLM_TOKENS.inc(input_tokens, call="stream", direction="input")
+                LLM_TOKENS.inc(output_tokens, call="stream", direction="output")
+                yield LLMResponse(answer="", input_tokens=input_tokens, output_tokens=output_tokens)
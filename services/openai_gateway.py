@@ -0,0 +1,203 @@
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+from exceptions.upstream_error import UpstreamError, UpstreamTimeoutError
+from utils.circuit_breaker import CircuitBreaker
+
+if TYPE_CHECKING:
+    from langchain_openai import OpenAIEmbeddings
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+_RETRYABLE_STATUS = {408, 409, 429}
+
+
+class OpenAIGateway:
+    """
+    Single entry point for calls to the OpenAI API. Owns the pooled HTTP
+    connections shared by the completion and embedding clients, and wraps every
+    call with a concurrency limit, a deadline, jittered exponential backoff on
+    429/5xx (honoring Retry-After) and a circuit breaker.
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            base_url: Optional[str] = None,
+            max_connections: int = 100,
+            max_keepalive_connections: int = 20,
+            http2: bool = True,
+            max_concurrency: int = 32,
+            max_retries: int = 4,
+            backoff_base_seconds: float = 0.5,
+            backoff_max_seconds: float = 20.0,
+            timeout_seconds: float = 60.0,
+            stream_idle_timeout_seconds: float = 30.0,
+            circuit_breaker: Optional[CircuitBreaker] = None,
+            http_client: Optional[httpx.AsyncClient] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.timeout_seconds = timeout_seconds
+        self.stream_idle_timeout_seconds = stream_idle_timeout_seconds
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections
+        )
+        self.http_client = http_client or httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout_seconds)
+        self.sync_http_client = httpx.Client(http2=http2, limits=limits, timeout=timeout_seconds)
+
+        # The SDK takes about a second to import, so it is loaded with the first gateway rather than the module
+        from openai import AsyncOpenAI
+
+        # Retries are handled here, so the SDK's own retry loop is disabled
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http_client,
+            max_retries=0
+        )
+
+    def create_embeddings(self, model: str) -> "OpenAIEmbeddings":
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(
+            model=model,
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_async_client=self.http_client,
+            http_client=self.sync_http_client,
+            max_retries=0
+        )
+
+    async def close(self) -> None:
+        await self.http_client.aclose()
+        self.sync_http_client.close()
+
+    async def call(self, func: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        async with self._semaphore:
+            return await self._call_with_retries(func, *args, **kwargs)
+
+    async def stream(self, func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        """
+        Opens a streaming call (retried until the stream is established) and yields
+        its events. The concurrency slot is only held until the response headers
+        arrive, so long answers do not starve embeddings and other calls; open
+        streams are bounded by request admission and the connection pool.
+        """
+        import openai
+
+        async with self._semaphore:
+            stream = await self._call_with_retries(func, *args, **kwargs)
+
+        try:
+            iterator = stream.__aiter__()
+            while True:
+                try:
+                    async with asyncio.timeout(self.stream_idle_timeout_seconds):
+                        event = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                yield event
+        except TimeoutError:
+            self.circuit_breaker.record_failure()
+            raise UpstreamTimeoutError("OpenAI stream stalled.")
+        except (openai.APIError, httpx.HTTPError) as e:
+            self.circuit_breaker.record_failure()
+            raise UpstreamError(f"OpenAI stream failed: {e}") from e
+        finally:
+            await stream.close()
+
+    async def _call_with_retries(self, func: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        import openai
+
+        deadline = time.monotonic() + self.timeout_seconds
+        attempt = 0
+
+        while True:
+            self.circuit_breaker.before_call()
+            remaining = deadline - time.monotonic()
+
+            try:
+                async with asyncio.timeout(remaining):
+                    result = await func(*args, **kwargs)
+            except TimeoutError:
+                self.circuit_breaker.record_failure()
+                raise UpstreamTimeoutError(f"OpenAI call exceeded {self.timeout_seconds}s deadline.")
+
+            except (openai.APIConnectionError, openai.APIStatusError) as e:
+                status = getattr(e, "status_code", None)
+                retryable = status is None or status in _RETRYABLE_STATUS or status >= 500
+
+                if not retryable:
+                    # Client errors say nothing about upstream health
+                    self.circuit_breaker.record_success()
+                    raise UpstreamError(f"OpenAI rejected the request: {e}") from e
+
+                self.circuit_breaker.record_failure()
+                retry_after = self._retry_after(e)
+                delay = self._backoff(attempt, retry_after)
+
+                if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                    raise UpstreamError(f"OpenAI call failed after {attempt + 1} attempts: {e}",
+                                        retry_after=retry_after) from e
+
+                logger.warning("OpenAI call failed (status=%s), retrying in %.2fs", status, delay)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            except BaseException:
+                # Cancellation or an unexpected error says nothing about upstream health either,
+                # but a half-open trial must not hold the only slot forever
+                self.circuit_breaker.release_trial()
+                raise
+
+            self.circuit_breaker.record_success()
+            return result
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # Full jitter keeps synchronized clients from retrying in lockstep
+        delay = random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max_seconds))
+        return delay
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+
+        headers = response.headers
+        if "retry-after-ms" in headers:
+            try:
+                return float(headers["retry-after-ms"]) / 1000
+            except ValueError:
+                pass
+
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            parsed = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, parsed.timestamp() - time.time())
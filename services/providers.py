@@ -1,55 +1,96 @@
-import faiss
-from fastapi import Depends
-from langchain_community.docstore import InMemoryDocstore
+from typing import Optional
 
+from fastapi import Depends, Request
+
+from services.admission_controller import AdmissionController
+from services.batch_question_service import BatchQuestionService
+from services.indexing_queue import IndexingQueue
+from services.ingestion_service import DocumentIngestionService
 from services.llm_service import LLMService
 from services.question_service import QuestionService
 from services.rag_service import RAGService
+from services.semantic_cache import SemanticResponseCache
+from services.service_registry import ServiceRegistry
+from services.summarization_service import SummarizationService
+from services.summary_cache import SummaryCache
 from services.text_preprocessing_service import TextPreprocessingService
-from config.settings import settings
 
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-import os
+
+def get_service_registry(request: Request) -> ServiceRegistry:
+    return request.app.state.service_registry
 
 # LLMService provider
-def get_llm_service() -> LLMService:
-    return LLMService(model=settings.model, api_key=settings.openai_api_key)
+def get_llm_service(registry: ServiceRegistry = Depends(get_service_registry)) -> LLMService:
+    return registry.llm_service
 
 # TextPreprocessingService provider
-def get_text_preprocessing_service() -> TextPreprocessingService:
-    return TextPreprocessingService(model=settings.model, model_max_tokens=settings.model_max_tokens)
+def get_text_preprocessing_service(
+    registry: ServiceRegistry = Depends(get_service_registry)
+) -> TextPreprocessingService:
+    return registry.text_preprocessing_service
 
 # RAGService provider
-def get_rag_service() -> RAGService:
-    embedding_client = OpenAIEmbeddings(model=settings.embedding_model)
-
-    if os.path.exists(settings.vector_store_path):
-        vector_store = FAISS.load_local(
-            settings.vector_store_path,
-            embedding_client
-        )
-    else:
-        dim = len(embedding_client.embed_query("dimension_check"))
-        index = faiss.IndexFlatL2(dim)
-
-        vector_store = FAISS(
-            embedding_function=embedding_client,
-            index=index,
-            docstore=InMemoryDocstore({}),
-            index_to_docstore_id={}
-        )
-
-    return RAGService(embedding_client=embedding_client, vector_store=vector_store)
+def get_rag_service(registry: ServiceRegistry = Depends(get_service_registry)) -> RAGService:
+    return registry.rag_service
+
+# SummarizationService provider
+def get_summarization_service(
+    registry: ServiceRegistry = Depends(get_service_registry)
+) -> SummarizationService:
+    return registry.summarization_service
+
+# SummaryCache provider
+def get_summary_cache(registry: ServiceRegistry = Depends(get_service_registry)) -> SummaryCache:
+    return registry.summary_cache
+
+# SemanticResponseCache provider, None when the cache is disabled
+def get_semantic_cache(
+    registry: ServiceRegistry = Depends(get_service_registry)
+) -> Optional[SemanticResponseCache]:
+    return registry.semantic_cache
+
+# DocumentIngestionService provider
+def get_ingestion_service(
+    registry: ServiceRegistry = Depends(get_service_registry)
+) -> DocumentIngestionService:
+    return registry.ingestion_service
+
+# AdmissionController provider
+def get_admission_controller(registry: ServiceRegistry = Depends(get_service_registry)) -> AdmissionController:
+    return registry.admission_controller
+
+# IndexingQueue provider
+def get_indexing_queue(registry: ServiceRegistry = Depends(get_service_registry)) -> IndexingQueue:
+    return registry.indexing_queue
 
 # QuestionService provider
 def get_question_service(
     text_preprocessing_service: TextPreprocessingService = Depends(get_text_preprocessing_service),
     rag_service: RAGService = Depends(get_rag_service),
-    llm_service: LLMService = Depends(get_llm_service)
+    llm_service: LLMService = Depends(get_llm_service),
+    summarization_service: SummarizationService = Depends(get_summarization_service),
+    summary_cache: SummaryCache = Depends(get_summary_cache),
+    semantic_cache: Optional[SemanticResponseCache] = Depends(get_semantic_cache),
+    indexing_queue: IndexingQueue = Depends(get_indexing_queue)
 ) -> QuestionService:
     return QuestionService(
         text_preprocessing_service=text_preprocessing_service,
         rag_service=rag_service,
-        llm_service=llm_service
+        llm_service=llm_service,
+        summarization_service=summarization_service,
+        summary_cache=summary_cache,
+        semantic_cache=semantic_cache,
+        indexing_queue=indexing_queue
+    )
+
+# BatchQuestionService provider
+def get_batch_question_service(
+    registry: ServiceRegistry = Depends(get_service_registry),
+    question_service: QuestionService = Depends(get_question_service),
+    admission_controller: AdmissionController = Depends(get_admission_controller)
+) -> BatchQuestionService:
+    return BatchQuestionService(
+        question_service=question_service,
+        admission_controller=admission_controller,
+        workers=registry.settings.batch_workers
     )
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from exceptions.upstream_error import UpstreamError
+from models.question_response import QuestionResponse
+
+try:
+    import orjson
+
+    def _dumps(data: dict) -> bytes:
+        return orjson.dumps(data)
+except ImportError:  # orjson is optional, the stdlib encoder gives the same frames
+    def _dumps(data: dict) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = b": keep-alive\n\n"
+_DONE = object()
+
+
+def encode_event(data: dict, event: Optional[str] = None) -> bytes:
+    frame = b"data: " + _dumps(data) + b"\n\n"
+    return b"event: " + event.encode("ascii") + b"\n" + frame if event else frame
+
+
+def _response_event(reply: str, input_tokens: int = 0, output_tokens: int = 0) -> bytes:
+    return encode_event({"reply": reply, "input_tokens": input_tokens, "output_tokens": output_tokens})
+
+
+class QuestionEventStream:
+    """
+    Server-sent events for a question. After the first delta, text is
+    coalesced until max_buffer_chars or flush_interval_seconds; comment
+    heartbeats keep the connection alive while nothing is sent (e.g. during
+    summarization), and the answer generator, with the upstream OpenAI stream
+    behind it, is cancelled as soon as the client disconnects.
+    """
+
+    def __init__(
+            self,
+            responses: AsyncIterator[QuestionResponse],
+            is_disconnected: Callable[[], Awaitable[bool]],
+            flush_interval_seconds: float = 0.05,
+            max_buffer_chars: int = 256,
+            heartbeat_seconds: float = 15.0,
+            disconnect_poll_seconds: float = 0.5):
+        self.responses = responses
+        self.is_disconnected = is_disconnected
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_buffer_chars = max_buffer_chars
+        self.heartbeat_seconds = heartbeat_seconds
+        self.disconnect_poll_seconds = disconnect_poll_seconds
+
+    async def _produce(self, queue: asyncio.Queue) -> None:
+        # Runs in its own task so the consumer can wait with a timeout without cancelling the generator
+        try:
+            async for response in self.responses:
+                queue.put_nowait(response)
+        except UpstreamError as e:
+            queue.put_nowait(e)
+        except Exception as e:
+            # Headers are already sent, so a failure must not escape into the server; it ends the stream instead
+            logger.exception("Answer stream failed.")
+            queue.put_nowait(e)
+        finally:
+            await self.responses.aclose()
+            queue.put_nowait(_DONE)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        producer = asyncio.create_task(self._produce(queue))
+        pending_get: Optional[asyncio.Future] = None
+
+        buffer: List[str] = []
+        buffered_chars = 0
+        flush_at: Optional[float] = None
+        text_sent = False
+        last_sent = loop.time()
+        next_poll = last_sent + self.disconnect_poll_seconds
+
+        def flush() -> bytes:
+            nonlocal buffered_chars, flush_at, last_sent
+            frame = _response_event("".join(buffer))
+            buffer.clear()
+            buffered_chars = 0
+            flush_at = None
+            last_sent = loop.time()
+            return frame
+
+        try:
+            while True:
+                wake_at = min(last_sent + self.heartbeat_seconds, next_poll, flush_at or float("inf"))
+                if pending_get is None:
+                    pending_get = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({pending_get}, timeout=max(0.0, wake_at - loop.time()))
+
+                if done:
+                    item, pending_get = pending_get.result(), None
+
+                    if item is _DONE:
+                        if buffer:
+                            yield flush()
+                        return
+
+                    if isinstance(item, Exception):
+                        if buffer:
+                            yield flush()
+                        # Headers are already sent, so the failure is reported as an SSE error event
+                        if isinstance(item, UpstreamError):
+                            yield encode_event({"error": str(item), "retry_after": item.retry_after}, event="error")
+                        else:
+                            yield encode_event({"error": "Internal Server Error"}, event="error")
+                        return
+
+                    if item.reply:
+                        buffer.append(item.reply)
+                        buffered_chars += len(item.reply)
+                        if flush_at is None:
+                            flush_at = loop.time() + self.flush_interval_seconds
+                        # The first text goes out at once so coalescing never delays the first token
+                        if buffered_chars >= self.max_buffer_chars or not text_sent:
+                            text_sent = True
+                            yield flush()
+                    else:
+                        # Usage and end-of-answer frames go out at once, after any buffered text
+                        if buffer:
+                            yield flush()
+                        yield _response_event("", item.input_tokens, item.output_tokens)
+                        last_sent = loop.time()
+
+                now = loop.time()
+                if flush_at is not None and now >= flush_at:
+                    yield flush()
+
+                if now >= next_poll:
+                    if await self.is_disconnected():
+                        logger.info("Client disconnected, cancelling the answer stream.")
+                        return
+                    next_poll = now + self.disconnect_poll_seconds
+
+                if now - last_sent >= self.heartbeat_seconds:
+                    yield HEARTBEAT
+                    last_sent = now
+        finally:
+            if pending_get is not None:
+                pending_get.cancel()
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    A text/event-stream response that calls on_close once it has ended, however
+    it ended, including when sending fails before the body is ever iterated.
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(self, content: AsyncIterator[bytes], on_close: Optional[Callable[[], None]] = None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
@@ -1,73 +1,236 @@
-from typing import List
+import asyncio
+import time
+from typing import AsyncIterator, List, Optional
 
 from enums.preprocess_strategy import PreprocessStrategy
 from mappers.llm_mapper import LLMMapper
+from models.document import Document
 from models.question_request import QuestionRequest
+from models.question_response import QuestionResponse
 from models.rag_chunk import RAGChunk
+from models.tokenized_text import TokenizedText
+from services.indexing_queue import IndexingQueue
 from services.llm_service import LLMService
 from services.rag_service import RAGService
+from services.semantic_cache import SemanticResponseCache
+from services.summarization_service import SummarizationService
+from services.summary_cache import CachedSummary, SummaryCache
 from services.system_prompt_factory import SystemPromptFactory
 from services.text_preprocessing_service import TextPreprocessingService
+from utils.blocking_pool import iterate_blocking, run_blocking
+from utils.metrics import REQUESTS, TIME_TO_FIRST_TOKEN, span, tracing
 
 
 class QuestionService:
+    CHUNK_PREFETCH_BATCH_SIZE = 16
+    CACHED_REPLAY_CHUNK_CHARS = 64
+    ATTACHMENT_CHARS_PER_TOKEN = 3  # Conservative estimate, attachments are tokenized for real later
 
     def __init__(self,
                  text_preprocessing_service: TextPreprocessingService,
                  rag_service: RAGService,
-                 llm_service: LLMService):
+                 llm_service: LLMService,
+                 summarization_service: SummarizationService,
+                 summary_cache: SummaryCache,
+                 semantic_cache: Optional[SemanticResponseCache] = None,
+                 indexing_queue: Optional[IndexingQueue] = None):
         self.text_preprocessing_service = text_preprocessing_service
         self.rag_service = rag_service
         self.llm_service = llm_service
+        self.summarization_service = summarization_service
+        self.summary_cache = summary_cache
+        self.semantic_cache = semantic_cache
+        self.indexing_queue = indexing_queue
+
+    async def _prepare_attachment(
+            self,
+            attachment: Document,
+            tokenized: TokenizedText,
+            strategy: PreprocessStrategy,
+            max_output_tokens: int) -> List[RAGChunk]:
+        if strategy == PreprocessStrategy.DIRECT:
+            chunks = [attachment.content]
+        elif strategy == PreprocessStrategy.CHUNK:
+            chunks = await self._chunk_and_prefetch(tokenized, max_output_tokens)
+        else:
+            chunks = await self._summarize_attachment(tokenized, max_output_tokens)
+
+        return self.rag_service.to_rag_chunks(chunks, attachment.fileName)
+
+    async def _chunk_and_prefetch(self, tokenized: TokenizedText, max_output_tokens: int) -> List[str]:
+        # Chunks are embedded batch by batch while the chunker is still producing the rest
+        chunks: List[str] = []
+        prefetches = []
+
+        chunk_iterator = self.text_preprocessing_service.iter_chunks(tokenized, max_output_tokens)
+        try:
+            with span("chunk"):
+                async for batch in iterate_blocking(chunk_iterator, self.CHUNK_PREFETCH_BATCH_SIZE):
+                    chunks.extend(batch)
+                    prefetches.append(asyncio.create_task(self.rag_service.prefetch_embeddings(batch)))
+
+            await asyncio.gather(*prefetches)
+        except BaseException:
+            # Cancelled (e.g. the client went away) or failed: stop embedding what nobody will use
+            for prefetch in prefetches:
+                prefetch.cancel()
+            raise
+        return chunks
+
+    async def _summarize_attachment(self, tokenized: TokenizedText, max_output_tokens: int) -> List[str]:
+        content = tokenized.text
+        cached = await self.summary_cache.get(content)
+        if cached is not None and cached.max_output_tokens == max_output_tokens:
+            return cached.chunks
+
+        if cached is not None:
+            cleaned_summary = cached.summary
+        else:
+            with span("summarize"):
+                summary = await self.summarization_service.summarize(tokenized)
+                cleaned_summary = self.text_preprocessing_service.clean_summary(summary)
 
-    def handle_question(self, request: QuestionRequest):
-        merged_attachments_content = self.text_preprocessing_service.merge_attachment_content(request.attachments)
-        strategy = self.text_preprocessing_service.get_preprocess_strategy(merged_attachments_content)
+        tokenized_summary = await run_blocking(self.text_preprocessing_service.tokenize, cleaned_summary)
+        next_strategy = self.text_preprocessing_service.get_preprocess_strategy(tokenized_summary)
 
+        if next_strategy == PreprocessStrategy.CHUNK:
+            chunks = await run_blocking(self.text_preprocessing_service.chunk,
+                                        tokenized_summary, max_output_tokens)
+        else:
+            chunks = [cleaned_summary]
+
+        await self.summary_cache.put(content, CachedSummary(
+            summary=cleaned_summary,
+            chunks=chunks,
+            max_output_tokens=max_output_tokens
+        ))
+        return chunks
+
+    def estimate_tokens(self, request: QuestionRequest) -> int:
+        """
+        Up-front token cost of a request for admission control: prompt and
+        context tokens, an estimate for attachments and the output allowance.
+        """
+        prompt_tokens = self.text_preprocessing_service.count_tokens(
+            SystemPromptFactory.get_planner_prompt(), request.prompt, request.context or ""
+        )
+        attachment_chars = sum(len(a.content) for a in request.attachments or [])
+        return prompt_tokens + attachment_chars // self.ATTACHMENT_CHARS_PER_TOKEN + request.max_output_tokens
+
+    async def handle_question(self, request: QuestionRequest) -> AsyncIterator[QuestionResponse]:
+        trace_token = tracing.start()
+        started_at = time.perf_counter()
+        first_token_seen = False
+        outcome = "error"
+
+        try:
+            async for response in self._handle_question(request):
+                if not first_token_seen and response.reply:
+                    first_token_seen = True
+                    TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started_at)
+                yield response
+            outcome = "ok"
+        finally:
+            REQUESTS.inc(outcome=outcome)
+            tracing.finish(trace_token)
+
+    async def _handle_question(self, request: QuestionRequest) -> AsyncIterator[QuestionResponse]:
+        # Only attachment-free questions are cached, attachments make every answer unique
+        use_semantic_cache = (self.semantic_cache is not None
+                              and request.use_cache
+                              and not request.attachments)
+
+        # Answers are only reused for the same retrieval settings and output budget
+        cache_options = (request.top_k, request.min_relevance, request.retrieval_mode, request.max_output_tokens)
+
+        if use_semantic_cache:
+            with span("semantic_cache_lookup"):
+                cached = await self.semantic_cache.lookup(
+                    request.tenant_id, request.prompt, request.context, cache_options
+                )
+            if cached is not None:
+                tracing.annotate(semantic_cache_hit=True)
+                for response in self._replay(cached.answer):
+                    yield response
+                return
+
+        answer_parts: List[str] = []
+        usage: Optional[QuestionResponse] = None
+
+        async for response in self._answer(request):
+            if use_semantic_cache:
+                answer_parts.append(response.reply)
+                if response.output_tokens > 0:
+                    usage = response  # The completed event carries the token usage
+            yield response
+
+        if use_semantic_cache and usage is not None:
+            await self.semantic_cache.store(
+                request.tenant_id, request.prompt, request.context,
+                answer="".join(answer_parts),
+                input_tokens=usage.input_tokens,
+                output_tokens=usage.output_tokens,
+                options=cache_options
+            )
+
+    def _replay(self, answer: str):
+        step = self.CACHED_REPLAY_CHUNK_CHARS
+        for i in range(0, len(answer), step):
+            yield QuestionResponse(reply=answer[i:i + step], input_tokens=0, output_tokens=0)
+        # No tokens were spent on a cached answer
+        yield QuestionResponse(reply="", input_tokens=0, output_tokens=0)
+
+    async def _answer(self, request: QuestionRequest) -> AsyncIterator[QuestionResponse]:
         all_rag_chunks: List[RAGChunk] = []
 
         if request.attachments:
-            for attachment in request.attachments:
-                if strategy == PreprocessStrategy.DIRECT:
-                    chunks = [attachment.content]
-                elif strategy == PreprocessStrategy.CHUNK:
-                    chunks = self.text_preprocessing_service.chunk(attachment.content, request.max_output_tokens)
-                else:
-                    system_prompt = SystemPromptFactory.get_summarize_prompt()
-                    llm_request = LLMMapper.to_llm_request(user_prompt=attachment.content, system_prompt=system_prompt)
-
-                    llm_response = self.llm_service.send_request(llm_request)
-                    summary = llm_response.answer
-
-                    cleaned_summary = self.text_preprocessing_service.clean_summary(summary)
-                    next_strategy = self.text_preprocessing_service.get_preprocess_strategy(cleaned_summary)
-
-                    if next_strategy == PreprocessStrategy.CHUNK:
-                        chunks = self.text_preprocessing_service.chunk(cleaned_summary, request.max_output_tokens)
-                    else:
-                        chunks = [cleaned_summary]
-
-                rag_chunks = self.rag_service.to_rag_chunks(chunks, attachment.fileName)
+            # Every attachment is tokenized once, off the event loop, and that encoding
+            # is reused for strategy selection, chunking and summarization
+            with span("tokenize"):
+                tokenized_attachments = await asyncio.gather(*(
+                    run_blocking(self.text_preprocessing_service.tokenize, attachment.content)
+                    for attachment in request.attachments
+                ))
+            strategy = self.text_preprocessing_service.get_strategy_for_tokens(
+                self.text_preprocessing_service.count_merged_tokens(tokenized_attachments)
+            )
+            tracing.annotate(strategy=strategy.value, attachments=len(request.attachments))
+
+            # Attachments are prepared concurrently, results keep the upload order
+            prepared = await asyncio.gather(*(
+                self._prepare_attachment(attachment, tokenized, strategy, request.max_output_tokens)
+                for attachment, tokenized in zip(request.attachments, tokenized_attachments)
+            ))
+            for rag_chunks in prepared:
                 all_rag_chunks.extend(rag_chunks)
 
-        top_k = self.rag_service.top_k
-        kb_chunks: List[RAGChunk] = []
-
-        if len(all_rag_chunks) > top_k:
-            attachment_chunks = self.rag_service.rank_chunks(all_rag_chunks, request.prompt, top_k)
-        elif len(all_rag_chunks) == top_k:
-            attachment_chunks = all_rag_chunks
-        else:
-            needed = top_k - len(all_rag_chunks)
-            attachment_chunks = all_rag_chunks
-            kb_chunks = self.rag_service.retrieve(request.prompt, needed)
-
-        self.rag_service.index_chunks(all_rag_chunks)
-
         system_prompt = SystemPromptFactory.get_planner_prompt()
+        reserved_tokens = await run_blocking(self.text_preprocessing_service.count_tokens,
+                                             system_prompt, request.prompt, request.context or "")
+        budget_tokens = self.text_preprocessing_service.get_context_budget(request.max_output_tokens,
+                                                                           reserved_tokens)
+
+        with span("select_context"):
+            attachment_chunks, kb_chunks = await self.rag_service.select_context(
+                all_rag_chunks,
+                request.prompt,
+                budget_tokens=budget_tokens,
+                count_tokens=self.text_preprocessing_service.count_tokens,
+                max_chunks=request.top_k,
+                min_score=request.min_relevance,
+                mode=request.retrieval_mode
+            )
+
+        # Indexing is handed to the background queue so the answer does not wait for it
+        with span("index"):
+            if self.indexing_queue is not None:
+                await self.indexing_queue.submit(all_rag_chunks)
+            else:
+                await self.rag_service.index_chunks(all_rag_chunks)
+
         llm_request = LLMMapper.to_llm_request(request=request, system_prompt=system_prompt,
                                                attachment_chunks=attachment_chunks,
                                                kb_chunks=kb_chunks)
 
-        for llm_response in self.llm_service.stream_request(llm_request):
+        async for llm_response in self.llm_service.stream_request(llm_request):
             yield LLMMapper.to_question_response(llm_response)
\ No newline at end of file
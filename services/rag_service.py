@@ -1,25 +1,116 @@
+import hashlib
 import uuid
 import numpy as np
 
+from enums.retrieval_mode import RetrievalMode
 from models.rag_chunk import RAGChunk
-from typing import List, Dict, Any, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from services.vector_index_factory import VectorIndexFactory
+from services.vector_store_persistence import VectorStorePersistence, WALRecord
+from utils.bm25_index import BM25Index
+from utils.blocking_pool import run_blocking
+from utils.metrics import span
+from utils.rank_fusion import reciprocal_rank_fusion
+from utils.rw_lock import RWLock
+from utils.vector_math import mmr_indices, normalize_rows
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
 
 class RAGService:
+    RRF_K = 60
+
     def __init__(
         self,
         embedding_client,
         vector_store,
         top_k: int = 5,
+        persistence: Optional[VectorStorePersistence] = None,
+        use_mmr: bool = False,
+        mmr_lambda: float = 0.5,
+        index_factory: Optional[VectorIndexFactory] = None,
+        candidate_k: int = 20,
+        min_score: float = 0.3,
+        dedupe_threshold: float = 0.95,
+        retrieval_mode: RetrievalMode = RetrievalMode.HYBRID,
+        read_only: bool = False,
+        lexical_index: Optional[BM25Index] = None,
     ):
         self.embedding_client = embedding_client
         self.vector_store = vector_store
         self.top_k = top_k
+        self.persistence = persistence
+        self.use_mmr = use_mmr
+        self.mmr_lambda = mmr_lambda
+        self.index_factory = index_factory
+        self.candidate_k = candidate_k
+        self.min_score = min_score
+        self.dedupe_threshold = dedupe_threshold
+        self.retrieval_mode = retrieval_mode
+        # A memory-mapped snapshot cannot take writes, FAISS aborts the process on an add
+        self.read_only = read_only
+        self.lock = RWLock()
+        # Hashes of every indexed chunk, so identical content is embedded and stored once,
+        # a BM25 index over the same chunks for exact-term matches (saved with the snapshot),
+        # and the FAISS position of every docstore id so stored vectors can be read back
+        self._content_hashes, self.lexical_index, self._positions = self._build_indexes(vector_store, lexical_index)
+
+    @staticmethod
+    def _build_indexes(
+            vector_store,
+            lexical_index: Optional[BM25Index] = None) -> Tuple[set[str], BM25Index, Dict[str, int]]:
+        content_hashes: set[str] = set()
+        lexical_index = lexical_index if lexical_index is not None else BM25Index()
+        # A saved BM25 index only lacks the chunks replayed from the write-ahead log
+        indexed = set(lexical_index.ids())
+        for doc_id, doc in getattr(vector_store.docstore, "_dict", {}).items():
+            content_hashes.add(content_hash(doc.page_content))
+            if doc_id not in indexed:
+                lexical_index.add(doc_id, doc.page_content)
+        positions = {doc_id: position for position, doc_id in vector_store.index_to_docstore_id.items()}
+        return content_hashes, lexical_index, positions
+
+    def replace_vector_store(self, vector_store, lexical_index: Optional[BM25Index] = None) -> None:
+        content_hashes, lexical_index, positions = self._build_indexes(vector_store, lexical_index)
+        with self.lock.write():
+            self.vector_store = vector_store
+            self._content_hashes = content_hashes
+            self.lexical_index = lexical_index
+            self._positions = positions
+
+    def migrate_index_if_needed(self) -> bool:
+        if self.index_factory is None or self.read_only:
+            return False
+
+        # Only copying the vectors needs the lock; a waiting writer would block searches behind it,
+        # so training runs with no lock held
+        with self.lock.read():
+            old_index = self.vector_store.index
+            if not self.index_factory.needs_migration(old_index):
+                return False
+            migrated_count = old_index.ntotal
+            vectors = old_index.reconstruct_n(0, migrated_count)
+
+        new_index = self.index_factory.build(vectors)
+
+        with self.lock.write():
+            if self.vector_store.index is not old_index:
+                return False
+            # Carry over vectors added between training and the swap
+            if old_index.ntotal > migrated_count:
+                new_index.add(old_index.reconstruct_n(migrated_count, old_index.ntotal - migrated_count))
+            self.vector_store.index = new_index
+
+        return True
 
     def to_rag_chunks(
             self,
             chunks: List[str],
             source_id: str,
             extra_metadata: Optional[Dict[str, Any]] = None,
+            start_index: int = 0,
     ) -> List[RAGChunk]:
         if not chunks:
             return []
@@ -27,7 +118,7 @@ class RAGService:
         extra_metadata = extra_metadata or {}
         rag_chunks: List["RAGChunk"] = []
 
-        for idx, chunk in enumerate(chunks):
+        for idx, chunk in enumerate(chunks, start=start_index):
             clean_chunk = chunk.strip()
             if not clean_chunk:
                 continue  # Skip empty chunks
@@ -46,59 +137,275 @@ class RAGService:
 
         return rag_chunks
 
-    def index_chunks(self, chunks: List[RAGChunk]) -> None:
+    async def _embed_matrix(self, texts: List[str]) -> np.ndarray:
+        with span("embed"):
+            if hasattr(self.embedding_client, "aembed_matrix"):
+                return await self.embedding_client.aembed_matrix(texts)
+            return np.asarray(await self.embedding_client.aembed_documents(texts), dtype=np.float32)
+
+    async def prefetch_embeddings(self, texts: List[str]) -> None:
+        # Warms the embedding cache so later ranking and indexing skip the API call
+        texts = [t.strip() for t in texts if t.strip()]
+        if texts:
+            await self._embed_matrix(texts)
+
+    def has_content_hash(self, key: str) -> bool:
+        return key in self._content_hashes
+
+    def _new_chunks(self, chunks: List[RAGChunk]) -> List[RAGChunk]:
+        # Drops chunks already in the store and repeats within the batch
+        seen = set()
+        fresh = []
+        for chunk in chunks:
+            key = content_hash(chunk.content)
+            if key not in seen and key not in self._content_hashes:
+                seen.add(key)
+                fresh.append(chunk)
+        return fresh
+
+    async def index_chunks(self, chunks: List[RAGChunk]) -> int:
+        """
+        Embeds and stores the chunks whose content is not indexed yet.
+        Returns the number of chunks added, always 0 for a read-only store.
+        """
+        if self.read_only:
+            return 0
+
+        chunks = self._new_chunks(chunks)
         if not chunks:
-            return
+            return 0
 
-        texts = [c.content for c in chunks]
-        metadatas = [c.metadata for c in chunks]
-        ids = [c.id for c in chunks]
+        # Embed outside the lock so readers are only blocked for the insert itself
+        embeddings = await self._embed_matrix([c.content for c in chunks])
+        return await run_blocking(self._insert, chunks, embeddings)
 
-        self.vector_store.add_texts(
-            texts=texts,
-            metadatas=metadatas,
-            ids=ids,
-        )
+    def _insert(self, chunks: List[RAGChunk], embeddings: np.ndarray) -> int:
+        with span("faiss_insert"), self.lock.write():
+            # Checked again under the lock, a concurrent call may have added the same content
+            keep = []
+            for i, chunk in enumerate(chunks):
+                key = content_hash(chunk.content)
+                if key not in self._content_hashes:
+                    self._content_hashes.add(key)
+                    keep.append(i)
+            if not keep:
+                return 0
 
-    def retrieve(self, query: str, top_k: int | None = None) -> List[RAGChunk]:
-        results = self.vector_store.similarity_search(
-            query=query,
-            k=top_k or self.top_k
-        )
+            ids = [chunks[i].id for i in keep]
+            texts = [chunks[i].content for i in keep]
+            metadatas = [chunks[i].metadata for i in keep]
+            vectors = embeddings[keep]
 
-        return [
-            RAGChunk(
-                id=r.metadata.get("id", ""),
-                content=r.page_content,
-                metadata=r.metadata
+            if self.persistence is not None:
+                self.persistence.append([
+                    WALRecord(id=i, text=t, metadata=m, vector=e)
+                    for i, t, m, e in zip(ids, texts, metadatas, vectors)
+                ])
+
+            first_position = self.vector_store.index.ntotal
+            self.vector_store.add_embeddings(
+                text_embeddings=list(zip(texts, vectors)),
+                metadatas=metadatas,
+                ids=ids,
             )
-            for r in results
+            for position, (doc_id, text) in enumerate(zip(ids, texts), start=first_position):
+                self.lexical_index.add(doc_id, text)
+                self._positions[doc_id] = position
+            return len(keep)
+
+    def _fuse(self, rankings: List[List[RAGChunk]]) -> List[RAGChunk]:
+        # Content is unique in the knowledge base, so it identifies a chunk across rankings
+        by_content: Dict[str, RAGChunk] = {}
+        for ranking in rankings:
+            for chunk in ranking:
+                by_content.setdefault(chunk.content, chunk)
+
+        fused = reciprocal_rank_fusion(([c.content for c in ranking] for ranking in rankings), self.RRF_K)
+        return [by_content[content] for content, _ in fused]
+
+    def _lexical_search(self, query: str, k: int) -> List[RAGChunk]:
+        with span("lexical_search"), self.lock.read():
+            hits = self.lexical_index.search(query, k)
+            documents = [self.vector_store.docstore.search(doc_id) for doc_id, _ in hits]
+
+        return [
+            RAGChunk(id=doc_id, content=doc.page_content, metadata=doc.metadata)
+            for (doc_id, _), doc in zip(hits, documents)
+            if not isinstance(doc, str)  # docstore returns a message string for unknown ids
+        ]
+
+    def _search_with_scores(self, query_embedding: np.ndarray, k: int) -> List[RAGChunk]:
+        """
+        Searches the index directly and scores hits by cosine similarity.
+        Normalized indexes return the inner product with the normalized query,
+        which is the cosine already; a flat L2 index is searched with the raw
+        query and returns distances, so its hits are scored from their stored vectors.
+        """
+        from langchain_community.vectorstores.utils import DistanceStrategy
+
+        query = np.ascontiguousarray(query_embedding, dtype=np.float32).reshape(1, -1)
+        query_vector = normalize_rows(query)[0]
+        euclidean = self.vector_store.distance_strategy == DistanceStrategy.EUCLIDEAN_DISTANCE
+
+        with span("faiss_search"), self.lock.read():
+            index = self.vector_store.index
+            distances, labels = index.search(query if euclidean else query_vector.reshape(1, -1), k)
+            hits = [(int(p), float(d)) for p, d in zip(labels[0], distances[0]) if p != -1]
+            if euclidean and hits:
+                vectors = normalize_rows(index.reconstruct_batch(np.array([p for p, _ in hits], dtype=np.int64)))
+                hits = [(p, float(s)) for (p, _), s in zip(hits, vectors @ query_vector)]
+
+            doc_ids = [self.vector_store.index_to_docstore_id[p] for p, _ in hits]
+            documents = [self.vector_store.docstore.search(doc_id) for doc_id in doc_ids]
+
+        return [
+            RAGChunk(id=doc_id, content=doc.page_content, metadata=doc.metadata, score=score)
+            for doc_id, doc, (_, score) in zip(doc_ids, documents, hits)
+            if not isinstance(doc, str)
         ]
 
-    def rank_chunks(
+    def _stored_vectors(self, chunks: List[RAGChunk]) -> Optional[np.ndarray]:
+        # Knowledge base vectors are read back from the index; None when the index cannot
+        # reconstruct them (an IVF index saved without a direct map)
+        with self.lock.read():
+            positions = [self._positions.get(c.id) for c in chunks]
+            if None in positions:
+                return None
+            try:
+                return self.vector_store.index.reconstruct_batch(np.array(positions, dtype=np.int64))
+            except RuntimeError:
+                return None
+
+    async def select_context(
             self,
-            chunks: List[RAGChunk],
+            attachment_chunks: List[RAGChunk],
             query: str,
-            top_k: int | None = None,
-    ) -> List[RAGChunk]:
-        if not chunks:
-            return []
+            budget_tokens: int,
+            count_tokens: Callable[[str], int],
+            max_chunks: int | None = None,
+            min_score: float | None = None,
+            mode: RetrievalMode | None = None,
+    ) -> Tuple[List[RAGChunk], List[RAGChunk]]:
+        """
+        Merges attachment chunks and knowledge base hits into one pool ranked by
+        relevance, skips near-duplicates and fills budget_tokens. Knowledge base
+        hits, BM25 hits included, must reach min_score cosine similarity to the
+        question; only a lexical selection without attachments, which embeds
+        nothing, skips that check. In hybrid mode the dense and lexical rankings
+        are combined by reciprocal rank fusion.
+        Returns the selected attachment and knowledge base chunks, best first.
+        """
+        min_score = self.min_score if min_score is None else min_score
+        mode = mode or self.retrieval_mode
+
+        lexical_chunks: List[RAGChunk] = []
+        if mode != RetrievalMode.DENSE:
+            lexical_chunks = await run_blocking(self._lexical_search, query, self.candidate_k)
+
+        # Without attachments a lexical-only selection needs no embedding call
+        if mode == RetrievalMode.LEXICAL and not attachment_chunks:
+            return [], await run_blocking(self._fill_ranked, lexical_chunks, budget_tokens,
+                                          count_tokens, max_chunks)
+
+        embeddings = await self._embed_matrix([query] + [c.content for c in attachment_chunks])
+        matrix = normalize_rows(embeddings)
+        query_vector = matrix[0]
+
+        kb_chunks: List[RAGChunk] = []
+        if mode != RetrievalMode.LEXICAL:
+            kb_chunks = await run_blocking(self._search_with_scores, embeddings[0], self.candidate_k)
+            kb_chunks = [c for c in kb_chunks if c.score >= min_score]
+        if lexical_chunks:
+            kb_chunks = self._fuse([kb_chunks, lexical_chunks])
+        if kb_chunks:
+            kb_matrix = await run_blocking(self._stored_vectors, kb_chunks)
+            if kb_matrix is None:
+                kb_matrix = await self._embed_matrix([c.content for c in kb_chunks])
+            kb_matrix = normalize_rows(kb_matrix)
+            # Sharing a term with the question is not enough, lexical hits face the same cutoff
+            relevant = kb_matrix @ query_vector >= min_score
+            kb_chunks = [c for c, keep in zip(kb_chunks, relevant) if keep]
+            matrix = np.vstack([matrix, kb_matrix[relevant]])
+            kept = {c.content for c in kb_chunks}
+            lexical_chunks = [c for c in lexical_chunks if c.content in kept]
+
+        candidates = list(attachment_chunks) + kb_chunks
+        position = {c.content: i for i, c in enumerate(kb_chunks, start=len(attachment_chunks))}
+        lexical_order = [position[c.content] for c in lexical_chunks]
 
-        top_k = top_k or self.top_k
-        query_embedding = self.embedding_client.embed_query(query)
-        chunk_embeddings = self.embedding_client.embed_documents(
-            [c.content for c in chunks]
+        return await run_blocking(
+            self._fill_budget, candidates, matrix[1:], query_vector, len(attachment_chunks),
+            budget_tokens, count_tokens, max_chunks, lexical_order
         )
 
-        def cosine_similarity(a, b):
-            a = np.array(a)
-            b = np.array(b)
-            return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+    def _fill_budget(
+            self,
+            candidates: List[RAGChunk],
+            matrix: np.ndarray,
+            query_vector: np.ndarray,
+            attachment_count: int,
+            budget_tokens: int,
+            count_tokens: Callable[[str], int],
+            max_chunks: int | None,
+            lexical_order: List[int] | None = None,
+    ) -> Tuple[List[RAGChunk], List[RAGChunk]]:
+        if not candidates:
+            return [], []
+
+        scores = matrix @ query_vector
+        for i, candidate in enumerate(candidates):
+            if i < attachment_count or candidate.score is None:
+                candidate.score = float(scores[i])
+
+        if self.use_mmr:
+            order = mmr_indices(matrix, query_vector, len(candidates), self.mmr_lambda)
+        else:
+            order = np.argsort(-scores)
+            if lexical_order:
+                # The dense ranking covers the whole pool, the BM25 ranking only knowledge base hits
+                fused = reciprocal_rank_fusion([order.tolist(), lexical_order], self.RRF_K)
+                order = [i for i, _ in fused]
+
+        selected: List[int] = []
+        used_tokens = 0
+
+        for i in order:
+            if max_chunks is not None and len(selected) >= max_chunks:
+                break
+
+            if selected and float(np.max(matrix[selected] @ matrix[i])) >= self.dedupe_threshold:
+                continue
+
+            tokens = count_tokens(candidates[i].content)
+            if used_tokens + tokens > budget_tokens:
+                continue  # A smaller, lower-ranked chunk may still fit
+
+            selected.append(int(i))
+            used_tokens += tokens
+
+        attachment_selected = [candidates[i] for i in selected if i < attachment_count]
+        kb_selected = [candidates[i] for i in selected if i >= attachment_count]
+        return attachment_selected, kb_selected
+
+    @staticmethod
+    def _fill_ranked(
+            chunks: List[RAGChunk],
+            budget_tokens: int,
+            count_tokens: Callable[[str], int],
+            max_chunks: int | None,
+    ) -> List[RAGChunk]:
+        selected: List[RAGChunk] = []
+        used_tokens = 0
+
+        for chunk in chunks:
+            if max_chunks is not None and len(selected) >= max_chunks:
+                break
+
+            tokens = count_tokens(chunk.content)
+            if used_tokens + tokens > budget_tokens:
+                continue
 
-        scored_chunks = []
-        for chunk, emb in zip(chunks, chunk_embeddings):
-            score = cosine_similarity(query_embedding, emb)
-            scored_chunks.append((score, chunk))
+            selected.append(chunk)
+            used_tokens += tokens
 
-        scored_chunks.sort(key=lambda x: x[0], reverse=True)
-        return [chunk for _, chunk in scored_chunks[:top_k]]
+        return selected
@@ -0,0 +1,150 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from utils.vector_math import normalize_rows
+
+if TYPE_CHECKING:
+    import faiss
+
+
+@dataclass
+class CachedAnswer:
+    tenant_id: str
+    options: Hashable
+    answer: str
+    input_tokens: int
+    output_tokens: int
+    created_at: float
+
+
+class SemanticResponseCache:
+    """
+    Reuses answers to questions that are semantically close to earlier ones.
+    Each tenant and set of answer options (e.g. retrieval settings and output
+    budget, which must match exactly) has its own small inner-product FAISS
+    index over normalized prompt embeddings; entries expire after ttl_seconds
+    and the least recently used ones are evicted once max_entries is reached.
+    """
+
+    DEFAULT_TENANT = "__default__"
+    # Nearest entries looked at, so an expired nearest one does not hide a live one just behind it
+    LOOKUP_CANDIDATES = 8
+
+    def __init__(
+            self,
+            embedding_client,
+            similarity_threshold: float = 0.95,
+            ttl_seconds: float = 24 * 3600,
+            max_entries: int = 5000):
+        self.embedding_client = embedding_client
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._indexes: Dict[Tuple[str, Hashable], "faiss.IndexIDMap2"] = {}
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key_text(prompt: str, context: Optional[str]) -> str:
+        return f"{prompt}\n\n{context}" if context else prompt
+
+    async def _embed(self, prompt: str, context: Optional[str]) -> np.ndarray:
+        vector = (await self.embedding_client.aembed_matrix([self._key_text(prompt, context)]))[0]
+        return normalize_rows(vector).reshape(1, -1)
+
+    async def lookup(
+            self,
+            tenant_id: Optional[str],
+            prompt: str,
+            context: Optional[str],
+            options: Hashable = ()) -> Optional[CachedAnswer]:
+        key = (tenant_id or self.DEFAULT_TENANT, options)
+        index = self._indexes.get(key)
+        if index is None or index.ntotal == 0:
+            self.misses += 1
+            return None
+
+        scores, ids = index.search(await self._embed(prompt, context), min(self.LOOKUP_CANDIDATES, index.ntotal))
+        now = time.time()
+
+        # Results come best first, so the first live entry above the threshold is the answer
+        for score, entry_id in zip(scores[0], ids[0]):
+            if score < self.similarity_threshold:
+                break
+            entry = self._entries.get(int(entry_id))
+            if entry is None:
+                continue
+            if now - entry.created_at > self.ttl_seconds:
+                self._remove(int(entry_id))
+                continue
+
+            self._entries.move_to_end(int(entry_id))
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        return None
+
+    async def store(
+            self,
+            tenant_id: Optional[str],
+            prompt: str,
+            context: Optional[str],
+            answer: str,
+            input_tokens: int,
+            output_tokens: int,
+            options: Hashable = ()) -> None:
+        tenant_id = tenant_id or self.DEFAULT_TENANT
+        vector = await self._embed(prompt, context)
+
+        index = self._indexes.get((tenant_id, options))
+        if index is None:
+            import faiss
+
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            self._indexes[(tenant_id, options)] = index
+
+        entry_id = self._next_id
+        self._next_id += 1
+        index.add_with_ids(vector, np.asarray([entry_id], dtype=np.int64))
+        self._entries[entry_id] = CachedAnswer(
+            tenant_id=tenant_id,
+            options=options,
+            answer=answer,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            created_at=time.time()
+        )
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+
+        key = (entry.tenant_id, entry.options)
+        index = self._indexes.get(key)
+        if index is not None:
+            index.remove_ids(np.asarray([entry_id], dtype=np.int64))
+            if index.ntotal == 0:
+                del self._indexes[key]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "tenants": len({tenant_id for tenant_id, _ in self._indexes}),
+        }
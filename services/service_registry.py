@@ -0,0 +1,307 @@
+from typing import TYPE_CHECKING
+
+import httpx
+
+from config.settings import Settings
+from enums.retrieval_mode import RetrievalMode
+from enums.vector_index_type import VectorIndexType
+from services.admission_controller import AdmissionController
+from services.context_packer import ContextPacker
+from services.embedding_cache import CachedEmbeddings
+from services.embedding_dispatcher import EmbeddingDispatcher
+from services.indexing_queue import IndexingQueue
+from services.ingestion_service import DocumentIngestionService
+from services.llm_service import LLMService
+from services.openai_gateway import OpenAIGateway
+from services.rag_service import RAGService
+from services.semantic_cache import SemanticResponseCache
+from services.summarization_service import SummarizationService
+from services.summary_cache import SummaryCache
+from services.text_preprocessing_service import TextPreprocessingService
+from services.vector_index_factory import VectorIndexFactory
+from services.vector_store_persistence import VectorStorePersistence
+from utils.bm25_index import BM25Index
+from utils.blocking_pool import configure_blocking_pool, run_blocking, shutdown_blocking_pool
+from utils.circuit_breaker import CircuitBreaker
+from utils.metrics import (ADMISSION_ACTIVE, ADMISSION_QUEUE_LENGTH, CACHE_HIT_RATIO, INDEXING_QUEUE_DEPTH,
+                           VECTOR_STORE_SIZE, metrics, tracing)
+from utils.sqlite_kv_store import SqliteKVStore
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+
+class ServiceRegistry:
+    """
+    Holds the process-wide service instances. Created once in the application
+    lifespan so the vector store is loaded a single time and shared by all requests.
+    """
+
+    # Mapped by preload() in the parent process and inherited by the workers it forks
+    _preloaded_vector_store: "FAISS | None" = None
+    _preloaded_lexical_index: BM25Index | None = None
+
+    def __init__(self, settings: Settings, http_client: httpx.AsyncClient | None = None):
+        self.settings = settings
+        # Optional pre-built client, e.g. one routed to a local stub of the OpenAI API
+        self.http_client = http_client
+        self.gateway: OpenAIGateway | None = None
+        self.embedding_dispatcher: EmbeddingDispatcher | None = None
+        self.embedding_client: CachedEmbeddings | None = None
+        self.embedding_cache_store: SqliteKVStore | None = None
+        self.llm_service: LLMService | None = None
+        self.text_preprocessing_service: TextPreprocessingService | None = None
+        self.rag_service: RAGService | None = None
+        self.summarization_service: SummarizationService | None = None
+        self.summary_cache: SummaryCache | None = None
+        self.summary_cache_store: SqliteKVStore | None = None
+        self.semantic_cache: SemanticResponseCache | None = None
+        self.persistence: VectorStorePersistence | None = None
+        self.ingestion_service: DocumentIngestionService | None = None
+        self.indexing_queue: IndexingQueue | None = None
+        self.admission_controller: AdmissionController | None = None
+        self.index_factory = VectorIndexFactory(
+            index_type=VectorIndexType(settings.vector_index_type),
+            hnsw_m=settings.hnsw_m,
+            hnsw_ef_search=settings.hnsw_ef_search,
+            ivf_nlist=settings.ivf_nlist,
+            ivf_nprobe=settings.ivf_nprobe,
+            pq_m=settings.pq_m,
+            migrate_threshold=settings.index_migrate_threshold
+        )
+
+    @classmethod
+    def preload(cls, settings: Settings) -> None:
+        """
+        Runs the expensive, read-only part of startup once in a parent process
+        before it forks workers: imports the heavy libraries, loads the tiktoken
+        encoding and, with vector_store_read_only, maps the snapshot. The forked
+        workers share these pages instead of each building a copy.
+        """
+        import faiss  # noqa: F401
+        import langchain_openai  # noqa: F401
+        import openai  # noqa: F401
+
+        # tiktoken keeps one encoding per name, so every later service reuses this one
+        TextPreprocessingService(model=settings.model, model_max_tokens=settings.model_max_tokens)
+
+        if settings.vector_store_read_only:
+            registry = cls(settings)
+            persistence = VectorStorePersistence(snapshot_path=settings.vector_store_path)
+            cls._preloaded_vector_store = persistence.load_read_only(
+                None,
+                lambda: None,  # No snapshot yet, each worker creates its own empty store
+                distance_strategy=registry.index_factory.distance_strategy,
+                normalize_L2=registry.index_factory.normalize_L2
+            )
+            cls._preloaded_lexical_index = persistence.load_lexical_index()
+
+    async def start(self) -> None:
+        configure_blocking_pool(self.settings.blocking_pool_size)
+        metrics.enabled = self.settings.metrics_enabled
+        tracing.enabled = self.settings.request_tracing_enabled
+
+        if self.settings.embedding_cache_path:
+            self.embedding_cache_store = SqliteKVStore(self.settings.embedding_cache_path, table="embeddings")
+
+        self.gateway = OpenAIGateway(
+            api_key=self.settings.openai_api_key,
+            base_url=self.settings.openai_base_url,
+            max_connections=self.settings.openai_max_connections,
+            max_keepalive_connections=self.settings.openai_max_keepalive_connections,
+            http2=self.settings.openai_http2,
+            max_concurrency=self.settings.openai_max_concurrency,
+            max_retries=self.settings.openai_max_retries,
+            timeout_seconds=self.settings.openai_timeout_seconds,
+            circuit_breaker=CircuitBreaker(
+                failure_threshold=self.settings.circuit_failure_threshold,
+                reset_timeout=self.settings.circuit_reset_seconds
+            ),
+            http_client=self.http_client
+        )
+
+        openai_embeddings = self.gateway.create_embeddings(self.settings.embedding_model)
+        self.embedding_dispatcher = EmbeddingDispatcher(
+            embed_batch=lambda texts: self.gateway.call(openai_embeddings.aembed_documents, texts),
+            window_seconds=self.settings.embedding_batch_window_seconds,
+            max_batch_inputs=self.settings.embedding_max_batch_inputs,
+            max_batch_tokens=self.settings.embedding_max_batch_tokens
+        )
+        self.embedding_client = CachedEmbeddings(
+            embedding_client=openai_embeddings,
+            model=self.settings.embedding_model,
+            memory_size=self.settings.embedding_cache_size,
+            disk_store=self.embedding_cache_store,
+            dispatcher=self.embedding_dispatcher
+        )
+        self.text_preprocessing_service = TextPreprocessingService(
+            model=self.settings.model,
+            model_max_tokens=self.settings.model_max_tokens
+        )
+        self.llm_service = LLMService(
+            model=self.settings.model,
+            api_key=self.settings.openai_api_key,
+            context_packer=ContextPacker(self.text_preprocessing_service),
+            gateway=self.gateway
+        )
+        self.summarization_service = SummarizationService(
+            llm_service=self.llm_service,
+            text_preprocessing_service=self.text_preprocessing_service,
+            concurrency=self.settings.summary_concurrency,
+            summary_max_output_tokens=self.settings.summary_max_output_tokens
+        )
+
+        if self.settings.summary_cache_path:
+            self.summary_cache_store = SqliteKVStore(self.settings.summary_cache_path, table="summaries")
+
+        self.summary_cache = SummaryCache(
+            model=self.settings.model,
+            max_size=self.settings.summary_cache_size,
+            ttl_seconds=self.settings.summary_cache_ttl_seconds,
+            disk_store=self.summary_cache_store
+        )
+        if self.settings.semantic_cache_enabled:
+            self.semantic_cache = SemanticResponseCache(
+                embedding_client=self.embedding_client,
+                similarity_threshold=self.settings.semantic_cache_threshold,
+                ttl_seconds=self.settings.semantic_cache_ttl_seconds,
+                max_entries=self.settings.semantic_cache_max_entries
+            )
+
+        self.persistence = VectorStorePersistence(
+            snapshot_path=self.settings.vector_store_path,
+            snapshot_interval_seconds=self.settings.snapshot_interval_seconds
+        )
+        vector_store = self._preloaded_vector_store if self.settings.vector_store_read_only else None
+        if vector_store is not None:
+            vector_store.embedding_function = self.embedding_client
+            lexical_index = self._preloaded_lexical_index
+        else:
+            vector_store = await run_blocking(self._load_vector_store)
+            lexical_index = await run_blocking(self.persistence.load_lexical_index)
+
+        self.rag_service = RAGService(
+            embedding_client=self.embedding_client,
+            vector_store=vector_store,
+            persistence=self.persistence,
+            use_mmr=self.settings.rank_use_mmr,
+            mmr_lambda=self.settings.mmr_lambda,
+            index_factory=self.index_factory,
+            candidate_k=self.settings.retrieval_candidate_k,
+            min_score=self.settings.retrieval_min_score,
+            dedupe_threshold=self.settings.retrieval_dedupe_threshold,
+            retrieval_mode=RetrievalMode(self.settings.retrieval_mode),
+            read_only=self.settings.vector_store_read_only,
+            lexical_index=lexical_index
+        )
+        self.ingestion_service = DocumentIngestionService(
+            text_preprocessing_service=self.text_preprocessing_service,
+            rag_service=self.rag_service,
+            workers=self.settings.ingestion_workers,
+            batch_size=self.settings.ingestion_batch_size,
+            chunk_tokens=self.settings.ingestion_chunk_tokens,
+            overlap_tokens=self.settings.ingestion_overlap_tokens
+        )
+        self.indexing_queue = IndexingQueue(
+            rag_service=self.rag_service,
+            max_pending_chunks=self.settings.indexing_queue_max_chunks,
+            batch_size=self.settings.indexing_batch_size,
+            flush_interval_seconds=self.settings.indexing_flush_seconds
+        )
+        self.indexing_queue.start()
+        self.admission_controller = AdmissionController(
+            tokens_per_minute=self.settings.admission_tokens_per_minute,
+            max_concurrency=self.settings.admission_max_concurrency,
+            max_queue_length=self.settings.admission_max_queue_length,
+            small_request_tokens=self.settings.admission_small_request_tokens,
+            max_wait_seconds=self.settings.admission_max_wait_seconds
+        )
+        # Read-only workers never write, snapshots are taken by the process that ingests
+        if not self.settings.vector_store_read_only:
+            self.persistence.start(self.rag_service)
+        self._register_gauges()
+
+    def _register_gauges(self) -> None:
+        # Callbacks go through self so they follow replaced or stopped services
+        CACHE_HIT_RATIO.set_function(lambda: self.embedding_client.stats()["hit_ratio"], cache="embedding")
+        CACHE_HIT_RATIO.set_function(lambda: self.summary_cache.stats()["hit_ratio"], cache="summary")
+        if self.semantic_cache is not None:
+            CACHE_HIT_RATIO.set_function(lambda: self.semantic_cache.stats()["hit_ratio"], cache="semantic")
+        VECTOR_STORE_SIZE.set_function(lambda: self.rag_service.vector_store.index.ntotal)
+        INDEXING_QUEUE_DEPTH.set_function(lambda: self.indexing_queue.depth)
+        ADMISSION_QUEUE_LENGTH.set_function(lambda: self.admission_controller.queue_length)
+        ADMISSION_ACTIVE.set_function(lambda: self.admission_controller.active)
+
+    async def stop(self) -> None:
+        # Drain pending chunks first so the final snapshot includes them
+        if self.indexing_queue is not None:
+            await self.indexing_queue.stop()
+            self.indexing_queue = None
+
+        if self.persistence is not None and self.rag_service is not None and not self.rag_service.read_only:
+            await run_blocking(self.persistence.stop, self.rag_service)
+
+        if self.embedding_dispatcher is not None:
+            await self.embedding_dispatcher.close()
+
+        self.persistence = None
+        self.admission_controller = None
+        self.ingestion_service = None
+        self.rag_service = None
+        self.summarization_service = None
+        self.summary_cache = None
+        self.semantic_cache = None
+        self.llm_service = None
+        self.text_preprocessing_service = None
+        self.embedding_client = None
+        self.embedding_dispatcher = None
+
+        if self.embedding_cache_store is not None:
+            self.embedding_cache_store.close()
+            self.embedding_cache_store = None
+
+        if self.summary_cache_store is not None:
+            self.summary_cache_store.close()
+            self.summary_cache_store = None
+
+        if self.gateway is not None:
+            await self.gateway.close()
+            self.gateway = None
+
+        shutdown_blocking_pool()
+
+    async def reload_vector_store(self) -> None:
+        if self.rag_service is None:
+            raise RuntimeError("Service registry is not started.")
+
+        # Fold pending log records into the snapshot before reading it back
+        if not self.rag_service.read_only:
+            await run_blocking(self.persistence.snapshot, self.rag_service)
+        vector_store = await run_blocking(self._load_vector_store)
+        lexical_index = await run_blocking(self.persistence.load_lexical_index)
+        await run_blocking(self.rag_service.replace_vector_store, vector_store, lexical_index)
+
+    def _load_vector_store(self) -> "FAISS":
+        load = self.persistence.load_read_only if self.settings.vector_store_read_only else self.persistence.load
+        return load(
+            self.embedding_client,
+            self._create_vector_store,
+            distance_strategy=self.index_factory.distance_strategy,
+            normalize_L2=self.index_factory.normalize_L2
+        )
+
+    def _create_vector_store(self) -> "FAISS":
+        from langchain_community.docstore import InMemoryDocstore
+        from langchain_community.vectorstores import FAISS
+
+        dim = len(self.embedding_client.embed_query("dimension_check"))
+        index = self.index_factory.create(dim)
+
+        return FAISS(
+            embedding_function=self.embedding_client,
+            index=index,
+            docstore=InMemoryDocstore({}),
+            index_to_docstore_id={},
+            distance_strategy=self.index_factory.distance_strategy,
+            normalize_L2=self.index_factory.normalize_L2
+        )
@@ -0,0 +1,69 @@
+import asyncio
+from typing import List
+
+from mappers.llm_mapper import LLMMapper
+from models.llm_request import LLMRequest
+from models.tokenized_text import TokenizedText
+from services.llm_service import LLMService
+from services.system_prompt_factory import SystemPromptFactory
+from services.text_preprocessing_service import TextPreprocessingService
+from utils.blocking_pool import run_blocking
+
+
+class SummarizationService:
+    """
+    Map-reduce summarizer. The document is split into pieces that fit one call,
+    the pieces are summarized concurrently, and the partial summaries are
+    summarized again until the result fits within the model's context budget.
+    """
+
+    def __init__(
+            self,
+            llm_service: LLMService,
+            text_preprocessing_service: TextPreprocessingService,
+            concurrency: int = 4,
+            summary_max_output_tokens: int = 1024,
+            max_reduce_rounds: int = 4):
+        self.llm_service = llm_service
+        self.text_preprocessing_service = text_preprocessing_service
+        self.summary_max_output_tokens = summary_max_output_tokens
+        self.max_reduce_rounds = max_reduce_rounds
+        # Shared by all requests, so it bounds the total number of in-flight summary calls
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def summarize(self, text: str | TokenizedText) -> str:
+        budget = self.text_preprocessing_service.model_max_tokens
+
+        summaries = await self._summarize_pieces(text, SystemPromptFactory.get_summarize_prompt())
+        combined = "\n\n".join(summaries)
+
+        rounds = 0
+        while len(summaries) > 1 and rounds < self.max_reduce_rounds:
+            tokenized = await run_blocking(self.text_preprocessing_service.tokenize, combined)
+            if len(tokenized) <= budget:
+                break
+
+            summaries = await self._summarize_pieces(tokenized, SystemPromptFactory.get_combine_summaries_prompt())
+            combined = "\n\n".join(summaries)
+            rounds += 1
+
+        return combined
+
+    async def _summarize_pieces(self, text: str | TokenizedText, system_prompt: str) -> List[str]:
+        pieces = await run_blocking(
+            self.text_preprocessing_service.chunk,
+            text,
+            self.summary_max_output_tokens,
+            0
+        )
+        requests = [
+            LLMMapper.to_llm_request(user_prompt=piece, system_prompt=system_prompt)
+            for piece in pieces
+        ]
+        return list(await asyncio.gather(*(self._summarize(r) for r in requests)))
+
+    async def _summarize(self, llm_request: LLMRequest) -> str:
+        llm_request.max_output_tokens = self.summary_max_output_tokens
+        async with self._semaphore:
+            llm_response = await self.llm_service.send_request(llm_request)
+        return llm_response.answer
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import time
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+from services.system_prompt_factory import SystemPromptFactory
+from utils.blocking_pool import run_blocking
+from utils.lru_cache import LRUCache
+from utils.sqlite_kv_store import SqliteKVStore
+
+
+@dataclass
+class CachedSummary:
+    summary: str  # Cleaned summary
+    chunks: List[str]  # Chunks derived from the summary
+    max_output_tokens: int  # Output budget the chunks were sized for
+    stored_at: float = 0.0
+
+
+class SummaryCache:
+    """
+    Caches cleaned attachment summaries and their chunks so repeat uploads of
+    the same document skip the summarization calls. Entries are keyed by the
+    document content, the model and the summarization prompts.
+    """
+
+    def __init__(
+            self,
+            model: str,
+            max_size: int = 256,
+            ttl_seconds: Optional[float] = None,
+            disk_store: Optional[SqliteKVStore] = None):
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self.memory = LRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.disk_store = disk_store
+
+        # Any prompt edit changes the version, so stale summaries are never served
+        prompts = SystemPromptFactory.get_summarize_prompt() + SystemPromptFactory.get_combine_summaries_prompt()
+        self.prompt_version = hashlib.sha256(prompts.encode("utf-8")).hexdigest()[:12]
+
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, content: str) -> str:
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        return f"{self.model}:{self.prompt_version}:{digest}"
+
+    async def get(self, content: str) -> Optional[CachedSummary]:
+        key = self._key(content)
+
+        entry = self.memory.get(key)
+        if entry is None and self.disk_store is not None:
+            entry = await run_blocking(self._load, key)
+            if entry is not None:
+                self.memory.put(key, entry)
+
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    async def put(self, content: str, entry: CachedSummary) -> None:
+        key = self._key(content)
+        entry.stored_at = time.time()
+        self.memory.put(key, entry)
+
+        if self.disk_store is not None:
+            data = json.dumps(asdict(entry), ensure_ascii=False).encode("utf-8")
+            await run_blocking(self.disk_store.put, key, data)
+
+    def _load(self, key: str) -> Optional[CachedSummary]:
+        data = self.disk_store.get(key)
+        if data is None:
+            return None
+
+        entry = CachedSummary(**json.loads(data.decode("utf-8")))
+        if self.ttl_seconds is not None and time.time() - entry.stored_at > self.ttl_seconds:
+            self.disk_store.delete(key)
+            return None
+        return entry
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "memory_entries": len(self.memory),
+        }
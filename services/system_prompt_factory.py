@@ -16,6 +16,24 @@ class SystemPromptFactory:
         )
         return prompt
 
+    @staticmethod
+    def get_combine_summaries_prompt() -> str:
+        """
+        Returns a system prompt for merging partial summaries of one document.
+        """
+        prompt = (
+            "Role: You are an AI assistant specialized in analyzing and summarizing documents.\n"
+            "Purpose: The user provides consecutive partial summaries of a single long document. "
+            "Merge them into one concise, coherent summary.\n"
+            "Instructions: "
+            "1. Keep the key points and main ideas from every part.\n"
+            "2. Remove points repeated across parts.\n"
+            "3. Preserve the original order of topics.\n"
+            "4. Use simple, clear language.\n"
+            "5. Preserve factual accuracy and context from the partial summaries."
+        )
+        return prompt
+
     @staticmethod
     def get_planner_prompt() -> str:
         """
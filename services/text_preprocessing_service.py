@@ -1,10 +1,199 @@
 import re
 import tiktoken
 
-from typing import Optional, List
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from typing import Callable, Iterable, Iterator, Optional, List, TypeVar
 from models.document import Document
+from models.tokenized_text import SENTENCE_BOUNDARY, TokenizedText
 from enums.preprocess_strategy import PreprocessStrategy
 
+T = TypeVar("T")
+
+# clean_summary patterns, compiled once. The prefix is a markdown header followed by a bullet marker
+_SUMMARY_LINE_PREFIX = re.compile(r'(?:#{1,6}\s*)?(?:[-•*]\s*)?')
+_SUMMARY_PREFIX_CHARS = frozenset("#-•*")
+_SUMMARY_STRONG = re.compile(r'(\*\*|__)(.*?)\1')
+_SUMMARY_EMPHASIS = re.compile(r'([*_])(.*?)\1')
+
+# A line break followed by a non-space character. The pre-tokenization of the current tokenizers
+# (cl100k, o200k) never merges across it, nor across a space that follows a non-space character, so
+# text cut at either encodes piece by piece exactly as in one piece
+_SAFE_CUT = re.compile(r'[\r\n](?=\S)')
+
+
+def _last_word_cut(text: str) -> int:
+    # The last space that follows a non-space character, or 0
+    index = text.rfind(" ", 1)
+    while index > 0 and text[index - 1].isspace():
+        index = text.rfind(" ", 1, index)
+    return max(index, 0)
+
+
+def _iter_segments(source: Iterable[str], segment_chars: int) -> Iterator[str]:
+    """
+    Regroups text given as consecutive pieces (e.g. the lines of an open file)
+    into segments of about segment_chars. A segment ends after a line break, or
+    before a space when the text has no line break to cut at, and text with
+    neither is buffered until it has one. Each piece is scanned for line breaks
+    once and only the text after the last segment is kept.
+    """
+    pending: list[str] = []
+    pending_chars = 0
+    cut = 0  # Position of the last line break cut in the pending text
+    after_break = False
+    flush_at = segment_chars
+
+    for piece in source:
+        if not piece:
+            continue
+        if after_break and not piece[0].isspace():
+            cut = pending_chars
+        for match in _SAFE_CUT.finditer(piece):
+            cut = pending_chars + match.end()
+        pending.append(piece)
+        pending_chars += len(piece)
+        after_break = piece[-1] in "\r\n"
+
+        if pending_chars < flush_at:
+            continue
+        text = "".join(pending)
+        if cut == 0:
+            cut = _last_word_cut(text)
+        if cut == 0:
+            # Nothing to cut at yet; looking again only once the text doubles keeps this linear
+            pending = [text]
+            flush_at = 2 * pending_chars
+            continue
+        yield text[:cut]
+        pending = [text[cut:]]
+        pending_chars -= cut
+        cut = 0
+        flush_at = segment_chars
+
+    if pending_chars:
+        yield "".join(pending)
+
+
+class _StreamRegion:
+    """
+    The part of a streamed document that paragraph and sentence detection
+    still looks at, addressed by document character and token positions like
+    a TokenizedText of the whole document. It starts at a token boundary.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.char_base = 0
+        self.token_base = 0
+        self.offsets = array("q")  # Document character offset of each token
+
+    @property
+    def end_char(self) -> int:
+        return self.char_base + len(self.text)
+
+    @property
+    def end_token(self) -> int:
+        return self.token_base + len(self.offsets)
+
+    def extend(self, tokenized: TokenizedText) -> None:
+        start = self.end_char
+        self.offsets.extend(start + offset for offset in tokenized.offsets)
+        self.text += tokenized.text
+
+    def trim(self, token: int) -> None:
+        # Drops what comes before the token, once that is at least half the region so the copies stay
+        # linear. The token just before is kept for the sentence boundary look-behind.
+        token -= 1
+        drop = token - self.token_base
+        if drop <= 0 or 2 * drop < len(self.offsets):
+            return
+        char = self.char_offset(token)
+        self.text = self.text[char - self.char_base:]
+        self.offsets = self.offsets[drop:]
+        self.char_base, self.token_base = char, token
+
+    def char_offset(self, token: int) -> int:
+        index = token - self.token_base
+        return self.offsets[index] if index < len(self.offsets) else self.end_char
+
+    def token_index(self, char: int) -> int:
+        return self.token_base + bisect_left(self.offsets, char)
+
+    def containing_token_index(self, char: int) -> int:
+        return self.token_base + max(0, bisect_right(self.offsets, char) - 1)
+
+    def find(self, sub: str, start: int) -> int:
+        index = self.text.find(sub, max(start - self.char_base, 0))
+        return -1 if index == -1 else self.char_base + index
+
+    def strip(self, start: int, end: int) -> tuple[int, int]:
+        text, base = self.text, self.char_base
+        while start < end and text[start - base].isspace():
+            start += 1
+        while end > start and text[end - 1 - base].isspace():
+            end -= 1
+        return start, end
+
+    def sentence_boundary(self, start: int, end: int) -> Optional[tuple[int, int]]:
+        match = SENTENCE_BOUNDARY.search(self.text, max(start - self.char_base, 0), end - self.char_base)
+        return None if match is None else (self.char_base + match.start(), self.char_base + match.end())
+
+
+class _SegmentWindow:
+    """
+    The tokenized segments of a streamed document that are still needed for
+    the current chunk and its overlap, addressed by document token index.
+    """
+
+    def __init__(self):
+        self._segments: deque[tuple[int, TokenizedText]] = deque()
+
+    def append(self, base: int, tokenized: TokenizedText) -> None:
+        self._segments.append((base, tokenized))
+
+    def slice(self, start: int, end: int) -> str:
+        parts = []
+        for base, tokenized in self._segments:
+            if base + len(tokenized) <= start or base >= end:
+                continue
+            parts.append(tokenized.slice(max(start - base, 0), min(end - base, len(tokenized))))
+        return "".join(parts)
+
+    def release(self, before: int) -> None:
+        while self._segments and self._segments[0][0] + len(self._segments[0][1]) <= before:
+            self._segments.popleft()
+
+
+def _pack_pieces(
+        pieces: Iterable[tuple[T, bool]],
+        size: Callable[[T], int],
+        max_tokens: int) -> Iterator[list[T]]:
+    # Greedily groups consecutive pieces up to max_tokens. Pieces flagged as
+    # standalone (token-level splits) always form a chunk of their own.
+    current: list[T] = []
+    current_tokens = 0
+
+    for piece, standalone in pieces:
+        piece_tokens = size(piece)
+
+        if current and (standalone or current_tokens + piece_tokens > max_tokens):
+            yield current
+            current = []
+            current_tokens = 0
+
+        if standalone:
+            yield [piece]
+            continue
+
+        current.append(piece)
+        current_tokens += piece_tokens
+
+    if current:
+        yield current
+
+
 class TextPreprocessingService:
     META_LINE_MAX_LEN = 40
 
@@ -20,6 +209,25 @@ class TextPreprocessingService:
     def _estimate_tokens(self, text: str) -> int:
         return len(self.encoder.encode(text))
 
+    def count_tokens(self, *texts: str) -> int:
+        return sum(len(self.encoder.encode(text)) for text in texts if text)
+
+    def tokenize(self, text: str) -> TokenizedText:
+        """
+        Encodes text once, keeping token offsets so strategy selection, chunking
+        and budget accounting can share the same encoding.
+        """
+        tokens = self.encoder.encode(text)
+        _, offsets = self.encoder.decode_with_offsets(tokens)
+        return TokenizedText.from_lists(text=text, tokens=tokens, offsets=offsets)
+
+    def count_merged_tokens(self, documents: List[TokenizedText]) -> int:
+        # Upper-bound estimate of tokenizing merge_attachment_content: one token per "\n" separator,
+        # though BPE may merge a separator with its neighbours. Close enough for strategy thresholds
+        if not documents:
+            return 0
+        return sum(len(doc) for doc in documents) + len(documents) - 1
+
     def merge_attachment_content(self, documents: Optional[List[Document]] = None) -> str:
         parts = []
 
@@ -29,9 +237,11 @@ class TextPreprocessingService:
 
         return "\n".join(parts)
 
-    def get_preprocess_strategy(self, text: str) -> PreprocessStrategy:
-        total_tokens = self._estimate_tokens(text)
+    def get_preprocess_strategy(self, text: str | TokenizedText) -> PreprocessStrategy:
+        total_tokens = len(text) if isinstance(text, TokenizedText) else self._estimate_tokens(text)
+        return self.get_strategy_for_tokens(total_tokens)
 
+    def get_strategy_for_tokens(self, total_tokens: int) -> PreprocessStrategy:
         if total_tokens <= self.model_max_tokens:
             return PreprocessStrategy.DIRECT
 
@@ -40,98 +250,317 @@ class TextPreprocessingService:
 
         return PreprocessStrategy.CHUNK
 
+    def get_context_budget(self, max_output_tokens: int, reserved_tokens: int = 0) -> int:
+        # Tokens left for retrieved context once the output and fixed prompt parts are paid for
+        return max(0, self.model_max_tokens - max_output_tokens - self.safety_buffer_tokens - reserved_tokens)
+
+    def _max_input_tokens(self, max_output_tokens: int) -> int:
+        return max(1, self.model_max_tokens - max_output_tokens - self.safety_buffer_tokens)
+
     def chunk(
             self,
-            text: str,
+            text: str | TokenizedText,
             max_output_tokens: int,
             overlap_tokens: int = 100
     ) -> list[str]:
-        max_input_tokens = self.model_max_tokens - max_output_tokens - self.safety_buffer_tokens
-
-        chunks: list[list[int]] = []
-        current_chunk_tokens: list[int] = []
-
-        paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+        tokenized = text if isinstance(text, TokenizedText) else self.tokenize(text)
+        return list(self.iter_chunks(tokenized, max_output_tokens, overlap_tokens))
 
-        for para in paragraphs:
-            para_tokens = self.encoder.encode(para)
-
-            if len(para_tokens) > max_input_tokens:
-                # fallback sentence
-                sentences = re.split(r'(?<=[.!?])\s+', para)
-                for sent in sentences:
-                    sent_tokens = self.encoder.encode(sent)
-
-                    if len(sent_tokens) > max_input_tokens:
-                        # fallback token-level
-                        for i in range(0, len(sent_tokens), max_input_tokens):
-                            chunks.append(sent_tokens[i:i + max_input_tokens])
-                        continue
+    def iter_chunks(
+            self,
+            source: str | TokenizedText | Iterable[str],
+            max_output_tokens: int,
+            overlap_tokens: int = 100
+    ) -> Iterator[str]:
+        """
+        Yields chunks as soon as they are filled. A TokenizedText is cut by slicing
+        its text; a plain string or an iterable of text pieces (e.g. an open file)
+        is tokenized about a chunk of text at a time, keeping only the current
+        chunk, the overlap window and the open paragraph or sentence in memory,
+        and gives the same chunks.
+        """
+        return self.iter_chunks_by_size(source, self._max_input_tokens(max_output_tokens), overlap_tokens)
+
+    def iter_chunks_by_size(
+            self,
+            source: str | TokenizedText | Iterable[str],
+            max_input_tokens: int,
+            overlap_tokens: int = 100
+    ) -> Iterator[str]:
+        # Same as iter_chunks with an explicit chunk size, e.g. for knowledge base ingestion
+        if isinstance(source, TokenizedText):
+            for start, end in self._iter_spans_by_size(source, max_input_tokens, overlap_tokens):
+                yield source.slice(start, end)
+            return
+
+        # Streamed text is tokenized a segment at a time into the same token positions a single
+        # encoding would give, so chunks (and their hashes) match the TokenizedText path exactly
+        window = _SegmentWindow()
+        pieces = self._iter_stream_pieces(source, window, max_input_tokens)
+        for start, end in self._pack_spans(pieces, max_input_tokens, overlap_tokens):
+            yield window.slice(start, end)
+            window.release(end - overlap_tokens if overlap_tokens > 0 else end)
+
+    def _iter_stream_pieces(
+            self,
+            source: str | Iterable[str],
+            window: _SegmentWindow,
+            max_input_tokens: int) -> Iterator[tuple[tuple[int, int], bool]]:
+        """
+        Yields the pieces _iter_span_pieces yields for the whole document,
+        reading segments only as far as each decision needs: to the end of a
+        paragraph, or until it is known to be too large, in which case its
+        sentences and the token-level splits of a too large sentence are
+        yielded as they complete.
+        """
+        # About a chunk of text per segment, at roughly four characters per token
+        segments = _iter_segments([source] if isinstance(source, str) else source, max_input_tokens * 4)
+        region = _StreamRegion()
+
+        def read() -> bool:
+            segment = next(segments, None)
+            if segment is None:
+                return False
+            tokenized = self.tokenize(segment)
+            window.append(region.end_token, tokenized)
+            region.extend(tokenized)
+            return True
+
+        more = read()
+        position = 0  # Where the current paragraph's text starts, as in TokenizedText.paragraph_spans
+        previous_end = 0
+        while True:
+            # Reads on until the paragraph ends or holds more tokens than fit in a chunk
+            scan = position
+            while True:
+                separator = region.find("\n\n", scan)
+                if separator != -1 or not more:
+                    break
+                # Trailing whitespace may still be stripped from the paragraph, so only tokens up to its
+                # last non-space character are sure to be in it
+                start_char, end_char = region.strip(position, region.end_char)
+                if (start_char < end_char and region.token_index(end_char)
+                        - max(region.containing_token_index(start_char), previous_end) > max_input_tokens):
+                    break
+                # A separator cannot straddle segments, they meet next to a non-space character
+                scan = region.end_char
+                more = read()
+
+            if separator != -1 or not more:
+                end = region.end_char if separator == -1 else separator
+                start_char, end_char = region.strip(position, end)
+                if start_char < end_char:
+                    token_start = max(region.containing_token_index(start_char), previous_end)
+                    token_end = region.token_index(end_char)
+                    if token_start < token_end:
+                        if token_end - token_start <= max_input_tokens:
+                            yield (token_start, token_end), False
+                        else:
+                            yield from self._iter_sentence_pieces(
+                                region, token_start, token_end, max_input_tokens)
+                        previous_end = token_end
+                if separator == -1:
+                    return
+                position = separator + 2
+                region.trim(min(region.containing_token_index(position), previous_end))
+                continue
 
-                    if len(current_chunk_tokens) + len(sent_tokens) > max_input_tokens:
-                        chunks.append(current_chunk_tokens)
-                        current_chunk_tokens = sent_tokens
+            # The paragraph is too large for a chunk before its end is even read, so it goes by sentences
+            token_start = max(region.containing_token_index(start_char), previous_end)
+            sentence_start = region.char_offset(token_start)
+            sentence_token = None  # Start token of the open sentence, once resolved
+            split_from = None  # Next token-level split of an open sentence known to be too large
+            previous_sentence_end = token_start
+            scan = sentence_start
+            paragraph_end = end_char  # After the last non-space character read so far
+            token_end = None
+
+            while True:
+                if token_end is None:
+                    separator = region.find("\n\n", max(position, region.char_base))
+                    start_char, end_char = region.strip(max(position, region.char_base),
+                                                        region.end_char if separator == -1 else separator)
+                    if start_char < end_char:
+                        paragraph_end = end_char
+                    if separator != -1 or not more:
+                        token_end = region.token_index(paragraph_end)
+                        end_char = region.char_offset(token_end)
+
+                boundary = region.sentence_boundary(scan, end_char if token_end is not None else region.end_char)
+                if boundary is None and token_end is None:
+                    # The sentence is still open: split it early once it is too large, then read on
+                    # The first token of a sentence starting right at the end of the region is yet to be read
+                    if sentence_token is None and sentence_start < region.end_char:
+                        sentence_token = max(region.containing_token_index(sentence_start), previous_sentence_end)
+                    if sentence_token is not None:
+                        content_end = region.token_index(paragraph_end)
+                        if split_from is None and content_end - sentence_token > max_input_tokens:
+                            split_from = sentence_token
+                        if split_from is not None:
+                            while split_from + max_input_tokens <= content_end:
+                                yield (split_from, split_from + max_input_tokens), True
+                                split_from += max_input_tokens
+                        region.trim(split_from if split_from is not None else sentence_token)
+                    scan = region.end_char
+                    more = read()
+                    continue
+
+                boundary_start, boundary_end = boundary if boundary is not None else (end_char, end_char)
+                if sentence_token is None:
+                    sentence_token = max(region.containing_token_index(sentence_start), previous_sentence_end)
+                span_end = region.token_index(boundary_start)
+                if token_end is not None:
+                    span_end = min(span_end, token_end)
+                if sentence_token < span_end:
+                    if split_from is not None or span_end - sentence_token > max_input_tokens:
+                        for i in range(split_from if split_from is not None else sentence_token,
+                                       span_end, max_input_tokens):
+                            yield (i, min(i + max_input_tokens, span_end)), True
                     else:
-                        current_chunk_tokens.extend(sent_tokens)
-            else:
-                if len(current_chunk_tokens) + len(para_tokens) > max_input_tokens:
-                    if current_chunk_tokens:
-                        chunks.append(current_chunk_tokens)
-                    current_chunk_tokens = para_tokens
+                        yield (sentence_token, span_end), False
+                    previous_sentence_end = span_end
+                if boundary is None:
+                    break
+
+                sentence_start = scan = boundary_end
+                sentence_token = split_from = None
+                # Once the paragraph end is read, a token may run on past it into the next paragraph
+                if token_end is None:
+                    region.trim(min(region.containing_token_index(sentence_start), previous_sentence_end))
+
+            previous_end = token_end
+            if separator == -1:
+                return
+            position = separator + 2
+            region.trim(min(region.containing_token_index(position), previous_end))
+
+    @staticmethod
+    def _iter_sentence_pieces(
+            region: _StreamRegion,
+            token_start: int,
+            token_end: int,
+            max_input_tokens: int) -> Iterator[tuple[tuple[int, int], bool]]:
+        # TokenizedText.sentence_spans and the fallbacks of _iter_span_pieces over a paragraph read whole
+        start_char = region.char_offset(token_start)
+        end_char = region.char_offset(token_end)
+        previous_end = token_start
+        sentence_start = start_char
+        while True:
+            boundary = region.sentence_boundary(sentence_start, end_char)
+            boundary_start, boundary_end = boundary if boundary is not None else (end_char, end_char)
+            span_start = max(region.containing_token_index(sentence_start), previous_end)
+            span_end = min(region.token_index(boundary_start), token_end)
+            if span_start < span_end:
+                if span_end - span_start > max_input_tokens:
+                    for i in range(span_start, span_end, max_input_tokens):
+                        yield (i, min(i + max_input_tokens, span_end)), True
                 else:
-                    current_chunk_tokens.extend(para_tokens)
+                    yield (span_start, span_end), False
+                previous_end = span_end
+            if boundary is None:
+                return
+            sentence_start = boundary_end
 
-        if current_chunk_tokens:
-            chunks.append(current_chunk_tokens)
+    def chunk_spans(
+            self,
+            tokenized: TokenizedText,
+            max_output_tokens: int,
+            overlap_tokens: int = 100
+    ) -> list[tuple[int, int]]:
+        return list(self.iter_chunk_spans(tokenized, max_output_tokens, overlap_tokens))
+
+    def iter_chunk_spans(
+            self,
+            tokenized: TokenizedText,
+            max_output_tokens: int,
+            overlap_tokens: int = 100
+    ) -> Iterator[tuple[int, int]]:
+        return self._iter_spans_by_size(tokenized, self._max_input_tokens(max_output_tokens), overlap_tokens)
 
-        # Apply overlap
-        if overlap_tokens > 0 and len(chunks) > 1:
-            overlapped_chunks = [chunks[0]]
-            for prev, curr in zip(chunks, chunks[1:]):
-                overlap = prev[-overlap_tokens:] if overlap_tokens < len(prev) else prev
-                overlapped_chunks.append(overlap + curr)
-            chunks = overlapped_chunks
+    def _iter_spans_by_size(
+            self,
+            tokenized: TokenizedText,
+            max_input_tokens: int,
+            overlap_tokens: int
+    ) -> Iterator[tuple[int, int]]:
+        return self._pack_spans(self._iter_span_pieces(tokenized, max_input_tokens), max_input_tokens, overlap_tokens)
+
+    @staticmethod
+    def _pack_spans(
+            pieces: Iterable[tuple[tuple[int, int], bool]],
+            max_input_tokens: int,
+            overlap_tokens: int
+    ) -> Iterator[tuple[int, int]]:
+        # Chunks are contiguous token ranges of the document
+        previous = None
+        for group in _pack_pieces(pieces, lambda span: span[1] - span[0], max_input_tokens):
+            start, end = group[0][0], group[-1][1]
+
+            # Apply overlap
+            if previous is not None and overlap_tokens > 0:
+                yield max(previous[0], previous[1] - overlap_tokens), end
+            else:
+                yield start, end
+            previous = (start, end)
+
+    @staticmethod
+    def _iter_span_pieces(
+            tokenized: TokenizedText,
+            max_input_tokens: int) -> Iterator[tuple[tuple[int, int], bool]]:
+        for para_start, para_end in tokenized.paragraph_spans():
+            if para_end - para_start <= max_input_tokens:
+                yield (para_start, para_end), False
+                continue
 
-        # Decode all chunks
-        return [self.encoder.decode(chunk_tokens) for chunk_tokens in chunks]
+            # fallback sentence
+            for sent_start, sent_end in tokenized.sentence_spans(para_start, para_end):
+                if sent_end - sent_start > max_input_tokens:
+                    # fallback token-level
+                    for i in range(sent_start, sent_end, max_input_tokens):
+                        yield (i, min(i + max_input_tokens, sent_end)), True
+                else:
+                    yield (sent_start, sent_end), False
 
     def clean_summary(self, text: str) -> str:
-        if not text or not text.strip():
+        """
+        Removes markdown headers, bullets and emphasis from a model summary and
+        drops meta lines. Runs once over the lines with precompiled patterns,
+        and lines without markup never reach a regex.
+        """
+        if not text:
             return ""
 
-        lines = text.splitlines()
         cleaned_lines = []
+        previous_blank = False
 
-        for line in lines:
+        for line in text.splitlines():
             line = line.strip()
 
             # 1. Skip empty lines
             if not line:
                 continue
 
-            # 2. Remove mark down headers
-            line = re.sub(r'^#{1,6}\s*', '', line)
-
-            # 3. Normalize bullet points
-            line = re.sub(r'^[-•*]\s*', '', line)
+            # 2. Remove mark down headers, then normalize bullet points
+            if line[0] in _SUMMARY_PREFIX_CHARS:
+                line = line[_SUMMARY_LINE_PREFIX.match(line).end():]
 
-            # 4. Drop meta lines (language-agnostic heuristics)
-            # Short title-like lines ending with ":" (e.g. "Summary:")
-            if len(line) <= self.META_LINE_MAX_LEN and line.endswith(":"):
+            # 3. Drop meta lines (language-agnostic heuristics): short title-like
+            # lines ending with ":" (e.g. "Summary:") and conversational offers (questions)
+            if "?" in line or (len(line) <= self.META_LINE_MAX_LEN and line.endswith(":")):
                 continue
 
-            # Conversational / assistant-like offers (questions)
-            if "?" in line:
-                continue
-
-            # 5. Remove excessive markdown emphasis
-            line = re.sub(r'(\*\*|__)(.*?)\1', r'\2', line)
-            line = re.sub(r'([*_])(.*?)\1', r'\2', line)
+            # 4. Remove excessive markdown emphasis
+            if "*" in line or "_" in line:
+                line = _SUMMARY_EMPHASIS.sub(r'\2', _SUMMARY_STRONG.sub(r'\2', line))
 
+            # 5. Normalize newlines: a line left empty by the markup removal is a blank
+            # line, and consecutive blank lines collapse into one
+            if not line:
+                if previous_blank:
+                    continue
+                previous_blank = True
+            else:
+                previous_blank = False
             cleaned_lines.append(line)
 
-        # 6. Normalize newlines
-        cleaned_text = "\n".join(cleaned_lines)
-        cleaned_text = re.sub(r'\n{3,}', '\n\n', cleaned_text)
-
-        return cleaned_text.strip()
\ No newline at end of file
+        return "\n".join(cleaned_lines).strip()
\ No newline at end of file
@@ -0,0 +1,102 @@
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from enums.vector_index_type import VectorIndexType
+
+if TYPE_CHECKING:
+    import faiss
+    from langchain_community.vectorstores.utils import DistanceStrategy
+
+
+class VectorIndexFactory:
+    """
+    Builds the FAISS index behind the knowledge base.
+    Every type except FLAT_L2 stores L2-normalized vectors under inner product,
+    so search scores are cosine similarities like the ones select_context ranks by.
+    """
+
+    def __init__(
+            self,
+            index_type: VectorIndexType = VectorIndexType.FLAT_IP,
+            hnsw_m: int = 32,
+            hnsw_ef_construction: int = 200,
+            hnsw_ef_search: int = 64,
+            ivf_nlist: int = 1024,
+            ivf_nprobe: int = 16,
+            pq_m: int = 16,
+            pq_nbits: int = 8,
+            migrate_threshold: int = 100_000):
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+        self.ivf_nlist = ivf_nlist
+        self.ivf_nprobe = ivf_nprobe
+        self.pq_m = pq_m
+        self.pq_nbits = pq_nbits
+        self.migrate_threshold = migrate_threshold
+
+    @property
+    def distance_strategy(self) -> "DistanceStrategy":
+        from langchain_community.vectorstores.utils import DistanceStrategy
+
+        if self.index_type == VectorIndexType.FLAT_L2:
+            return DistanceStrategy.EUCLIDEAN_DISTANCE
+        return DistanceStrategy.MAX_INNER_PRODUCT
+
+    @property
+    def normalize_L2(self) -> bool:
+        return self.index_type != VectorIndexType.FLAT_L2
+
+    def create(self, dim: int, training_vectors: Optional[np.ndarray] = None) -> "faiss.Index":
+        import faiss
+
+        if self.index_type == VectorIndexType.FLAT_L2:
+            return faiss.IndexFlatL2(dim)
+
+        if self.index_type == VectorIndexType.HNSW:
+            index = faiss.IndexHNSWFlat(dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = self.hnsw_ef_construction
+            index.hnsw.efSearch = self.hnsw_ef_search
+            return index
+
+        if self.index_type == VectorIndexType.IVF_PQ and training_vectors is not None:
+            return self._create_ivf_pq(dim, training_vectors)
+
+        # IVF-PQ cannot be trained on an empty store, so it starts flat and is
+        # migrated by migrate() once enough vectors have been collected.
+        return faiss.IndexFlatIP(dim)
+
+    def _create_ivf_pq(self, dim: int, training_vectors: np.ndarray) -> "faiss.Index":
+        import faiss
+
+        # FAISS needs roughly 39 training points per centroid
+        nlist = max(1, min(self.ivf_nlist, len(training_vectors) // 39))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, self.pq_m, self.pq_nbits, faiss.METRIC_INNER_PRODUCT)
+        index.train(np.ascontiguousarray(training_vectors, dtype=np.float32))
+        # Lets search results be reconstructed by position instead of embedded again
+        index.make_direct_map()
+        index.nprobe = min(self.ivf_nprobe, nlist)
+        return index
+
+    def needs_migration(self, index: "faiss.Index") -> bool:
+        import faiss
+
+        if self.index_type not in (VectorIndexType.HNSW, VectorIndexType.IVF_PQ):
+            return False
+        return isinstance(index, faiss.IndexFlatIP) and index.ntotal >= self.migrate_threshold
+
+    def migrate(self, index: "faiss.Index") -> "faiss.Index":
+        """
+        Rebuilds a flat index as the configured type. Vectors keep their
+        positions, so the store's index_to_docstore_id mapping stays valid.
+        """
+        return self.build(index.reconstruct_n(0, index.ntotal))
+
+    def build(self, vectors: np.ndarray) -> "faiss.Index":
+        """Trains an index of the configured type on vectors and adds them in order."""
+        new_index = self.create(vectors.shape[1], training_vectors=vectors)
+        new_index.add(vectors)
+        return new_index
@@ -0,0 +1,300 @@
+import json
+import logging
+import os
+import pickle
+import shutil
+import struct
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+    from utils.bm25_index import BM25Index
+
+# Record layout: <payload length><crc32 of payload><header length><header json><float32 vector>
+_RECORD_PREFIX = struct.Struct("<II")
+_HEADER_PREFIX = struct.Struct("<I")
+
+# Written next to FAISS.save_local's index.faiss and index.pkl
+_LEXICAL_INDEX_FILE = "bm25.pkl"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WALRecord:
+    id: str
+    text: str
+    metadata: Dict[str, Any]
+    vector: List[float]
+
+
+class VectorStorePersistence:
+    """
+    Append-only write-ahead log next to the FAISS snapshot directory.
+    New chunks are appended to the log, and a background thread periodically
+    folds the log into a full snapshot so restarts only replay the log tail.
+    """
+
+    def __init__(self, snapshot_path: str, snapshot_interval_seconds: float = 60.0):
+        self.snapshot_path = snapshot_path
+        self.wal_path = f"{snapshot_path}.wal"
+        self.snapshot_interval_seconds = snapshot_interval_seconds
+
+        self._file_lock = threading.Lock()
+        self._pending_records = 0
+        self._force_snapshot = False
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- startup ----------
+
+    def load(self, embedding_client, create_empty: Callable[[], "FAISS"], **load_kwargs: Any) -> "FAISS":
+        from langchain_community.vectorstores import FAISS
+
+        self._recover_interrupted_swap()
+
+        if os.path.exists(self.snapshot_path):
+            vector_store = FAISS.load_local(
+                self.snapshot_path,
+                embedding_client,
+                allow_dangerous_deserialization=True,
+                **load_kwargs
+            )
+        else:
+            vector_store = create_empty()
+
+        self._replay(vector_store)
+        return vector_store
+
+    def load_read_only(self, embedding_client, create_empty: Callable[[], "FAISS"], **load_kwargs: Any) -> "FAISS":
+        """
+        Maps the snapshot's vectors read-only instead of copying them into the
+        process, so every worker serving the same snapshot shares one copy in the
+        page cache. The log is not replayed: the index cannot take writes, and
+        records only reach readers once a writer folds them into a snapshot.
+        """
+        import faiss
+        from langchain_community.vectorstores import FAISS
+
+        if not os.path.exists(self.snapshot_path):
+            return create_empty()
+        if os.path.exists(self.wal_path) and os.path.getsize(self.wal_path) > 0:
+            logger.warning("Write-ahead log %s has records that are not in the snapshot yet.", self.wal_path)
+
+        # Older FAISS builds cannot map flat codes and fall back to reading them into memory
+        io_flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        return FAISS.load_local(
+            self.snapshot_path,
+            embedding_client,
+            allow_dangerous_deserialization=True,
+            io_flags=io_flags,
+            **load_kwargs
+        )
+
+    def load_lexical_index(self) -> Optional["BM25Index"]:
+        """
+        Returns the BM25 index saved with the snapshot, or None when there is
+        none (or it cannot be read) and it has to be rebuilt from the docstore.
+        """
+        path = os.path.join(self.snapshot_path, _LEXICAL_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            logger.warning("Could not read %s, rebuilding the lexical index.", path, exc_info=True)
+            return None
+
+    def _recover_interrupted_swap(self) -> None:
+        old_path = f"{self.snapshot_path}.old"
+        tmp_path = f"{self.snapshot_path}.tmp"
+
+        if not os.path.exists(self.snapshot_path) and os.path.exists(old_path):
+            os.replace(old_path, self.snapshot_path)
+
+        for path in (old_path, tmp_path):
+            if os.path.exists(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _replay(self, vector_store: "FAISS") -> None:
+        known_ids = set(vector_store.index_to_docstore_id.values())
+        records = [r for r in self._read_records() if r.id not in known_ids]
+
+        if records:
+            vector_store.add_embeddings(
+                text_embeddings=[(r.text, r.vector) for r in records],
+                metadatas=[r.metadata for r in records],
+                ids=[r.id for r in records],
+            )
+
+        self._pending_records = len(records)
+
+    def _read_records(self) -> Iterator[WALRecord]:
+        if not os.path.exists(self.wal_path):
+            return
+
+        valid_offset = 0
+        with open(self.wal_path, "rb") as f:
+            while True:
+                prefix = f.read(_RECORD_PREFIX.size)
+                if len(prefix) < _RECORD_PREFIX.size:
+                    break
+
+                length, crc = _RECORD_PREFIX.unpack(prefix)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+
+                valid_offset = f.tell()
+                yield self._decode(payload)
+
+        # Drop a torn tail left by a crash mid-append
+        if os.path.getsize(self.wal_path) != valid_offset:
+            with open(self.wal_path, "r+b") as f:
+                f.truncate(valid_offset)
+
+    # ---------- write path ----------
+
+    def append(self, records: List[WALRecord]) -> None:
+        if not records:
+            return
+
+        data = b"".join(self._encode(r) for r in records)
+
+        with self._file_lock:
+            with open(self.wal_path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending_records += len(records)
+
+    @staticmethod
+    def _encode(record: WALRecord) -> bytes:
+        header = json.dumps(
+            {"id": record.id, "text": record.text, "metadata": record.metadata},
+            ensure_ascii=False
+        ).encode("utf-8")
+        vector = np.asarray(record.vector, dtype=np.float32).tobytes()
+        payload = _HEADER_PREFIX.pack(len(header)) + header + vector
+        return _RECORD_PREFIX.pack(len(payload), zlib.crc32(payload)) + payload
+
+    @staticmethod
+    def _decode(payload: bytes) -> WALRecord:
+        (header_len,) = _HEADER_PREFIX.unpack_from(payload)
+        header_end = _HEADER_PREFIX.size + header_len
+        header = json.loads(payload[_HEADER_PREFIX.size:header_end].decode("utf-8"))
+        vector = np.frombuffer(payload[header_end:], dtype=np.float32).tolist()
+        return WALRecord(id=header["id"], text=header["text"], metadata=header["metadata"], vector=vector)
+
+    # ---------- snapshots ----------
+
+    def snapshot(self, rag_service) -> bool:
+        import faiss
+
+        # Inserts append to the log under the write lock, so under the read lock the index,
+        # the docstore and the log agree. Only copying them happens here: a waiting writer
+        # blocks new searches, so the files are written with no lock held.
+        with rag_service.lock.read():
+            if self._pending_records == 0 and not self._force_snapshot:
+                return False
+
+            vector_store = rag_service.vector_store
+            index_data = faiss.serialize_index(vector_store.index)
+            store_data = pickle.dumps((vector_store.docstore, vector_store.index_to_docstore_id))
+            lexical_data = pickle.dumps(rag_service.lexical_index)
+            with self._file_lock:
+                wal_offset = os.path.getsize(self.wal_path) if os.path.exists(self.wal_path) else 0
+                folded_records = self._pending_records
+            self._force_snapshot = False
+
+        try:
+            self._write_snapshot(index_data, store_data, lexical_data)
+        except BaseException:
+            self._force_snapshot = True
+            raise
+
+        self._fold_wal(wal_offset, folded_records)
+        return True
+
+    def _write_snapshot(self, index_data: np.ndarray, store_data: bytes, lexical_data: bytes) -> None:
+        # Same layout as FAISS.save_local, so load_local reads it back, plus the BM25 index
+        tmp_path = f"{self.snapshot_path}.tmp"
+        old_path = f"{self.snapshot_path}.old"
+
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, data in (("index.faiss", index_data), ("index.pkl", store_data),
+                           (_LEXICAL_INDEX_FILE, lexical_data)):
+            with open(os.path.join(tmp_path, name), "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        _fsync_dir(tmp_path)
+
+        if os.path.exists(self.snapshot_path):
+            os.replace(self.snapshot_path, old_path)
+        os.replace(tmp_path, self.snapshot_path)
+        _fsync_dir(os.path.dirname(os.path.abspath(self.snapshot_path)))
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    def _fold_wal(self, offset: int, records: int) -> None:
+        # Drops the records now in the snapshot and keeps those appended while it was written
+        with self._file_lock:
+            tmp_path = f"{self.wal_path}.tmp"
+            with open(tmp_path, "wb") as tmp:
+                if os.path.exists(self.wal_path):
+                    with open(self.wal_path, "rb") as f:
+                        f.seek(offset)
+                        shutil.copyfileobj(f, tmp)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp_path, self.wal_path)
+            self._pending_records -= records
+
+    def mark_dirty(self) -> None:
+        self._force_snapshot = True
+
+    def start(self, rag_service) -> None:
+        if self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(rag_service,),
+            name="vector-store-snapshotter",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, rag_service) -> None:
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+        self.snapshot(rag_service)
+
+    def _run(self, rag_service) -> None:
+        while not self._stop_event.wait(self.snapshot_interval_seconds):
+            try:
+                if rag_service.migrate_index_if_needed():
+                    self.mark_dirty()
+                self.snapshot(rag_service)
+            except Exception:
+                logger.exception("Vector store snapshot failed, keeping write-ahead log.")
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,52 @@
+import asyncio
+import contextvars
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def configure_blocking_pool(max_workers: int) -> None:
+    """
+    Sets up the bounded thread pool used for blocking work (FAISS, SQLite,
+    tiktoken) that must not run on the event loop.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+    _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="blocking")
+
+
+def shutdown_blocking_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    # Run inside a copy of the caller's context so context variables (request traces) carry over
+    context = contextvars.copy_context()
+    call = functools.partial(func, *args, **kwargs)
+    return await loop.run_in_executor(_executor, context.run, call)
+
+
+def _take(iterator: Iterator[T], count: int) -> List[T]:
+    return list(itertools.islice(iterator, count))
+
+
+async def iterate_blocking(iterator: Iterator[T], batch_size: int) -> AsyncIterator[List[T]]:
+    """
+    Drives a blocking iterator on the pool and yields its items in batches,
+    so consumers can start on early items while later ones are produced.
+    """
+    while True:
+        batch = await run_blocking(_take, iterator, batch_size)
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,84 @@
+import heapq
+import math
+import re
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, List, Tuple
+
+_TERM = re.compile(r"\w+(?:[-.]\w+)*")
+_COMPOUND_SEPARATOR = re.compile(r"[-.]")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i in is it me my not of on or so "
+    "that the their them there these they this to was we were what when where which who why will "
+    "with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    terms = []
+    for match in _TERM.finditer(text.lower()):
+        term = match.group()
+        if term in _STOPWORDS:
+            continue
+        terms.append(term)
+        # Codes such as "cs-101" or "v2.1" also match as "cs101" and on their parts
+        if "-" in term or "." in term:
+            parts = _COMPOUND_SEPARATOR.split(term)
+            terms.append("".join(parts))
+            terms.extend(part for part in parts if part and part not in _STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """
+    In-memory inverted index scored with Okapi BM25. Documents are only ever
+    added, matching the append-only knowledge base, so statistics are updated
+    incrementally and never rebuilt.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}  # term -> {document number: term frequency}
+        self._doc_ids: List[str] = []
+        self._doc_lengths: List[int] = []
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+
+    def ids(self) -> List[str]:
+        return list(self._doc_ids)
+
+    def add(self, doc_id: str, text: str) -> None:
+        terms = Counter(tokenize(text))
+        number = len(self._doc_ids)
+        length = sum(terms.values())
+
+        self._doc_ids.append(doc_id)
+        self._doc_lengths.append(length)
+        self._total_length += length
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[number] = frequency
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        count = len(self._doc_ids)
+        if count == 0 or k <= 0:
+            return []
+
+        average_length = self._total_length / count or 1.0
+        lengths = self._doc_lengths
+        k1, b = self.k1, self.b
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for number, frequency in postings.items():
+                norm = k1 * (1 - b + b * lengths[number] / average_length)
+                scores[number] = scores.get(number, 0.0) + idf * frequency * (k1 + 1) / (frequency + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=itemgetter(1))
+        return [(self._doc_ids[number], score) for number, score in best]
@@ -0,0 +1,230 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("planner.trace")
+
+_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        self._values: Dict[Tuple[str, ...], float] = {}
+        super().__init__(*args, **kwargs)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    """
+    Gauge whose value is read from a callback at scrape time, so the hot path pays nothing.
+    """
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        self._callbacks: Dict[Tuple[str, ...], Callable[[], float]] = {}
+        super().__init__(*args, **kwargs)
+
+    def set_function(self, callback: Callable[[], float], **labels: str) -> None:
+        self._callbacks[self._key(labels)] = callback
+
+    def _samples(self) -> List[str]:
+        samples = []
+        for key, callback in list(self._callbacks.items()):
+            try:
+                value = float(callback())
+            except Exception:
+                continue
+            samples.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return samples
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = _DEFAULT_BUCKETS, **kwargs):
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+        super().__init__(*args, **kwargs)
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def summary(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        # (count, sum) per label set, for in-process readers such as the benchmarks
+        with self._lock:
+            return {key: (sum(counts), self._sums[key]) for key, counts in self._counts.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._sums.clear()
+
+    def _samples(self) -> List[str]:
+        samples = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                    samples.append(f"{self.name}_bucket{labels} {cumulative}")
+                samples.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {self._sums[key]}")
+                samples.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.enabled = False
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# ---------- per-request traces ----------
+
+@dataclass
+class RequestTrace:
+    request_id: str
+    started_at: float = field(default_factory=time.perf_counter)
+    spans: List[Tuple[str, float]] = field(default_factory=list)  # (stage, seconds)
+    attributes: Dict[str, object] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "total_seconds": round(time.perf_counter() - self.started_at, 6),
+            "spans": [{"stage": stage, "seconds": round(seconds, 6)} for stage, seconds in self.spans],
+            **self.attributes,
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+class Tracing:
+    def __init__(self):
+        self.enabled = False
+
+    def start(self) -> Optional[contextvars.Token]:
+        if not self.enabled:
+            return None
+        return _current_trace.set(RequestTrace(request_id=uuid.uuid4().hex))
+
+    def finish(self, token: Optional[contextvars.Token]) -> None:
+        if token is None:
+            return
+        trace = _current_trace.get()
+        _current_trace.reset(token)
+        if trace is not None:
+            logger.info(json.dumps(trace.to_dict()))
+
+    @staticmethod
+    def annotate(**attributes: object) -> None:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.attributes.update(attributes)
+
+
+metrics = MetricsRegistry()
+tracing = Tracing()
+
+STAGE_SECONDS = Histogram(metrics, "planner_stage_duration_seconds",
+                          "Time spent in each stage of a request", ("stage",))
+TIME_TO_FIRST_TOKEN = Histogram(metrics, "planner_time_to_first_token_seconds",
+                                "Time from request start to the first streamed answer chunk")
+REQUESTS = Counter(metrics, "planner_requests_total", "Handled questions", ("outcome",))
+LLM_TOKENS = Counter(metrics, "planner_llm_tokens_total", "Tokens reported by the LLM", ("call", "direction"))
+CACHE_HIT_RATIO = Gauge(metrics, "planner_cache_hit_ratio", "Hit ratio of each cache", ("cache",))
+VECTOR_STORE_SIZE = Gauge(metrics, "planner_vector_store_vectors", "Vectors in the knowledge base index")
+INDEXING_QUEUE_DEPTH = Gauge(metrics, "planner_indexing_queue_depth", "Chunks waiting to be indexed")
+ADMISSION_QUEUE_LENGTH = Gauge(metrics, "planner_admission_queue_length", "Requests waiting for admission")
+ADMISSION_ACTIVE = Gauge(metrics, "planner_admission_active", "Admitted requests in progress")
+
+_NO_SPAN = nullcontext()
+
+
+@contextmanager
+def _timed(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((stage, elapsed))
+
+
+def span(stage: str):
+    """
+    Times a block as one request stage. Returns a shared no-op context when both
+    metrics and tracing are off, so instrumentation is effectively free.
+    """
+    if not metrics.enabled and _current_trace.get() is None:
+        return _NO_SPAN
+    return _timed(stage)
@@ -0,0 +1,15 @@
+from typing import Dict, Hashable, Iterable, List, Sequence, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[K]], k: int = 60) -> List[Tuple[K, float]]:
+    """
+    Merges ranked lists by summing 1 / (k + rank) per item, best first. Only
+    ranks are used, so lists scored on different scales combine without tuning.
+    """
+    scores: Dict[K, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,57 @@
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        norm = np.linalg.norm(matrix)
+        return matrix / norm if norm > 0 else matrix
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first, without sorting the full array.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def mmr_indices(
+        matrix: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        lambda_mult: float = 0.5) -> np.ndarray:
+    """
+    Maximal marginal relevance over pre-normalized rows: trades query relevance
+    against similarity to the rows already selected.
+    """
+    n = matrix.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    relevance = matrix @ query
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of every row to anything selected so far
+    max_redundancy = matrix @ matrix[selected[0]]
+
+    while len(selected) < k:
+        mmr_scores = lambda_mult * relevance - (1 - lambda_mult) * max_redundancy
+        mmr_scores[selected] = -np.inf
+        best = int(np.argmax(mmr_scores))
+        selected.append(best)
+        max_redundancy = np.maximum(max_redundancy, matrix @ matrix[best])
+
+    return np.asarray(selected, dtype=np.int64)